@@ -12,28 +12,56 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 
-from .database import init_database, seed_database
+from .database import AsyncSessionLocal, init_database, seed_database
 from .routes import router as blocks_router
+from .routes.bootstrap import router as bootstrap_router
 from .routes.compositions import router as compositions_router
 from .routes.insights import router as insights_router
 from .routes.prompts import router as prompts_router
 from .routes.public import router as public_router
 from .routes.search import router as search_router
 from .routes.stacks import router as stacks_router
+from .routes.sync import router as sync_router
 from .routes.tag_colors import router as tag_colors_router
-from .models import HealthResponse
+from .routes.tags import router as tags_router
+from .models import HealthResponse, ReadCacheMetrics
+from .services.change_feed import change_feed, tombstone_pruner
+from .services.content_cache import backfill_content_cache
+from .services.embeddings import load_vector_index, vector_index_sync
+from .services.jobs import worker_pool
+from .services.lineage import backfill_lineage
+from .services.openrouter import close_client
+from .services.read_cache import read_cache
+from .services.search_index import backfill_search_index
 
 load_dotenv()
 
 # Rate Limiter Setup
-limiter = Limiter(key_func=get_remote_address, default_limits=["100/minute"])
+limiter = Limiter(
+    key_func=get_remote_address,
+    default_limits=[os.getenv("RATE_LIMIT_DEFAULT", "100/minute")],
+)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup."""
+    """Initialize database and insight workers on startup; release them on shutdown."""
     await init_database()
     await seed_database()
+    async with AsyncSessionLocal() as session:
+        await backfill_lineage(session)
+        await backfill_content_cache(session)
+        await backfill_search_index(session)
+        await load_vector_index(session)
+    await worker_pool.start()
+    await change_feed.start()
+    await vector_index_sync.start()
+    await tombstone_pruner.start()
     yield
+    await tombstone_pruner.stop()
+    await vector_index_sync.stop()
+    await change_feed.stop()
+    await worker_pool.stop()
+    await close_client()
 
 
 app = FastAPI(
@@ -63,10 +91,13 @@ app.include_router(blocks_router, prefix="/api")
 app.include_router(prompts_router, prefix="/api")
 app.include_router(stacks_router, prefix="/api")
 app.include_router(tag_colors_router, prefix="/api")
+app.include_router(tags_router, prefix="/api")
 app.include_router(public_router, prefix="/api")
 app.include_router(compositions_router, prefix="/api")
 app.include_router(insights_router, prefix="/api")
 app.include_router(search_router, prefix="/api")
+app.include_router(sync_router, prefix="/api")
+app.include_router(bootstrap_router, prefix="/api")
 
 
 @app.get("/", response_model=HealthResponse)
@@ -79,3 +110,9 @@ def health_check():
 def api_health():
     """API health check."""
     return HealthResponse(status="ok", database="connected")
+
+
+@app.get("/api/cache/metrics", response_model=ReadCacheMetrics)
+def read_cache_metrics():
+    """Hit/miss counters of this worker's collection read cache."""
+    return ReadCacheMetrics(**read_cache.snapshot())
@@ -4,25 +4,39 @@ Database models and API schemas.
 
 from datetime import datetime
 from enum import Enum
-from typing import Any, Optional
+from typing import Annotated, Any, Literal, Optional, Union
 
 from pydantic import BaseModel, ConfigDict, Field
 from sqlalchemy import (
     JSON,
+    BigInteger,
     Boolean,
     Column,
+    Computed,
     DateTime,
+    Float,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Text,
+    UniqueConstraint,
     text,
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import declarative_base, deferred, relationship
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(tags::text, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(semantic_keywords, '')), 'C') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'D')"
+)
+
 
 class BlockType(str, Enum):
     persona = "persona"
@@ -33,6 +47,30 @@ class BlockType(str, Enum):
     example = "example"
 
 
+class TagMatch(str, Enum):
+    any = "any"
+    all = "all"
+
+
+class SearchEngine(str, Enum):
+    index = "index"
+    fulltext = "fulltext"
+    vector = "vector"
+
+
+class InsightKind(str, Enum):
+    tags = "tags"
+    quality = "quality"
+    related = "related"
+
+
+class InsightJobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
 class CompositionItemKind(str, Enum):
     prompt = "prompt"
     inline = "inline"
@@ -47,12 +85,30 @@ class CompositionSection(str, Enum):
     freeform = "freeform"
 
 
+class RenderPreset(str, Enum):
+    chatgpt = "chatgpt"
+    claude = "claude"
+    gemini = "gemini"
+    openrouter = "openrouter"
+
+
 class TagColorModel(Base):
     __tablename__ = "tag_colors"
 
     name = Column(String, primary_key=True)
     hue = Column(Integer, nullable=False)
     lightness = Column(Integer, nullable=False, server_default=text("32"))
+    change_seq = Column(BigInteger, nullable=True)
+
+
+class TagVocabularyModel(Base):
+    """Distinct block tags with the number of blocks using each, kept by a trigger."""
+
+    __tablename__ = "tag_vocabulary"
+    __table_args__ = (Index("idx_tag_vocabulary_lower_name", text("lower(name)")),)
+
+    name = Column(String, primary_key=True)
+    usage_count = Column(Integer, nullable=False)
 
 
 class StackModel(Base):
@@ -67,6 +123,7 @@ class StackModel(Base):
     cover_image = Column(String, nullable=True)
     published_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    change_seq = Column(BigInteger, nullable=True)
 
     blocks = relationship("PromptBlockModel", back_populates="stack")
 
@@ -78,13 +135,17 @@ class PromptBlockModel(Base):
     type = Column(String, nullable=False)
     title = Column(String, nullable=False)
     content = Column(Text, nullable=False)
-    tags = Column(JSON, default=list)
+    tags = Column(JSONB, default=list)
     stack_id = Column(String, ForeignKey("stacks.id"), nullable=True)
     stack_order = Column(Integer, nullable=True)
     parent_prompt_id = Column(String, nullable=True)
     root_prompt_id = Column(String, nullable=True)
     fork_note = Column(Text, nullable=True)
     derived_from_stack_id = Column(String, nullable=True)
+    semantic_keywords = Column(Text, nullable=True)
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
+    # Id of the last transaction that wrote the row, stamped by a trigger (see database.py).
+    change_seq = Column(BigInteger, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
@@ -100,6 +161,7 @@ class CompositionModel(Base):
     name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     source_stack_id = Column(String, nullable=True)
+    change_seq = Column(BigInteger, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
@@ -124,6 +186,7 @@ class CompositionItemModel(Base):
     section = Column(String, nullable=False)
     position = Column(Integer, nullable=False, server_default=text("0"))
     label = Column(String, nullable=True)
+    change_seq = Column(BigInteger, nullable=True)
 
     composition = relationship("CompositionModel", back_populates="items")
 
@@ -140,12 +203,100 @@ class PromptInsightModel(Base):
     scorecard = Column(JSON, nullable=True)
     semantic_profile = Column(JSON, nullable=True)
     related_prompt_ids = Column(JSON, nullable=False, server_default=text("'[]'::json"))
+    embedding = Column(LargeBinary, nullable=True)
     generated_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
 
 
+class InsightContentCacheModel(Base):
+    __tablename__ = "insight_content_cache"
+
+    content_hash = Column(String, primary_key=True)
+    scorecard = Column(JSON, nullable=True)
+    semantic_profile = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class PromptNeighborModel(Base):
+    __tablename__ = "prompt_neighbors"
+
+    prompt_id = Column(String, primary_key=True)
+    neighbor_id = Column(String, primary_key=True, index=True)
+    rank = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)
+    reason = Column(String, nullable=False)
+    # Content hashes of both prompts when the pair was scored.
+    source_hash = Column(String, nullable=False)
+    neighbor_hash = Column(String, nullable=False)
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class SyncTombstoneModel(Base):
+    __tablename__ = "sync_tombstones"
+
+    entity = Column(String, primary_key=True)
+    entity_id = Column(String, primary_key=True)
+    change_seq = Column(BigInteger, nullable=False, index=True)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class SyncHorizonModel(Base):
+    """One row: the highest change_seq among pruned tombstones. A sync resuming below it
+    may have missed deletes and has to start over."""
+
+    __tablename__ = "sync_horizon"
+
+    id = Column(Integer, primary_key=True)
+    pruned_through = Column(BigInteger, nullable=False, server_default=text("0"))
+
+
+class ChangeCounterModel(Base):
+    __tablename__ = "change_counters"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, server_default=text("0"))
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class PromptLineageModel(Base):
+    __tablename__ = "prompt_lineage"
+
+    ancestor_id = Column(String, primary_key=True)
+    descendant_id = Column(String, primary_key=True, index=True)
+    depth = Column(Integer, nullable=False)
+
+
+class PromptSearchTermModel(Base):
+    __tablename__ = "prompt_search_terms"
+
+    term = Column(String, primary_key=True)
+    prompt_id = Column(String, primary_key=True, index=True)
+    in_text = Column(Boolean, nullable=False, server_default=text("false"))
+    in_profile = Column(Boolean, nullable=False, server_default=text("false"))
+
+
+class InsightJobModel(Base):
+    __tablename__ = "insight_jobs"
+    __table_args__ = (
+        UniqueConstraint("prompt_id", "content_hash", "kind", name="uq_insight_jobs_dedupe"),
+        Index("idx_insight_jobs_status_created", "status", "created_at"),
+    )
+
+    id = Column(String, primary_key=True)
+    prompt_id = Column(String, nullable=False)
+    content_hash = Column(String, nullable=False)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, server_default=text("'queued'"))
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
 class PromptBlockBase(BaseModel):
     type: BlockType
     title: str
@@ -184,6 +335,48 @@ class PromptBlock(PromptBlockBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class BlockCreateOperation(BaseModel):
+    op: Literal["create"]
+    block: PromptBlockCreate
+
+
+class BlockUpdateOperation(BaseModel):
+    op: Literal["update"]
+    id: str
+    changes: PromptBlockUpdate
+
+
+class BlockDeleteOperation(BaseModel):
+    op: Literal["delete"]
+    id: str
+
+
+BlockOperation = Annotated[
+    Union[BlockCreateOperation, BlockUpdateOperation, BlockDeleteOperation],
+    Field(discriminator="op"),
+]
+
+
+class BlockBulkRequest(BaseModel):
+    operations: list[BlockOperation] = Field(min_length=1, max_length=1000)
+
+
+class BlockOperationResult(BaseModel):
+    index: int
+    op: str
+    id: str
+    status: str
+
+
+class BlockBulkResponse(BaseModel):
+    results: list[BlockOperationResult]
+
+
+class PromptBlockPage(BaseModel):
+    items: list[dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
 class TagColorBase(BaseModel):
     name: str
     hue: int
@@ -194,6 +387,18 @@ class TagColorCreate(TagColorBase):
     pass
 
 
+class TagFacet(BaseModel):
+    name: str
+    count: int
+
+
+class TagVocabularyEntry(BaseModel):
+    name: str
+    usage_count: int
+    hue: Optional[int] = None
+    lightness: Optional[int] = None
+
+
 class TagColor(TagColorBase):
     model_config = ConfigDict(from_attributes=True)
 
@@ -234,6 +439,23 @@ class Stack(StackBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class SyncTombstone(BaseModel):
+    entity: str
+    id: str
+    deleted_at: Optional[datetime] = None
+
+
+class SyncResponse(BaseModel):
+    watermark: int
+    blocks: list[PromptBlock] = Field(default_factory=list)
+    stacks: list[Stack] = Field(default_factory=list)
+    tag_colors: list[TagColor] = Field(default_factory=list)
+    tombstones: list[SyncTombstone] = Field(default_factory=list)
+    # ``since`` is older than the tombstone retention window: deletes may have been
+    # missed, so reload everything (e.g. from /bootstrap) and sync from its watermark.
+    resync_required: bool = False
+
+
 class PublicStackResponse(BaseModel):
     stack: Stack
     prompts: list[PromptBlock]
@@ -243,6 +465,21 @@ class LineageResponse(BaseModel):
     prompt: PromptBlock
     ancestors: list[PromptBlock]
     descendants: list[PromptBlock]
+    total_descendants: int = 0
+    truncated: bool = False
+
+
+class FamilyTreeNode(BaseModel):
+    prompt: PromptBlock
+    depth: int
+    child_count: int
+    subtree_size: int
+
+
+class FamilyTreeResponse(BaseModel):
+    root_prompt_id: str
+    size: int
+    nodes: list[FamilyTreeNode]
 
 
 class ForkPromptRequest(BaseModel):
@@ -315,6 +552,38 @@ class Composition(CompositionBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CompositionRender(BaseModel):
+    composition_id: str
+    preset: RenderPreset
+    text: str
+    cached: bool = False
+
+
+class CompositionPage(BaseModel):
+    items: list[Composition]
+    next_cursor: Optional[str] = None
+
+
+class CompositionSummary(CompositionBase):
+    id: str
+    item_count: int
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class CompositionSummaryPage(BaseModel):
+    items: list[CompositionSummary]
+    next_cursor: Optional[str] = None
+
+
+class BootstrapResponse(BaseModel):
+    # Pass as ``since`` to /sync to pick up changes made after this snapshot.
+    watermark: int
+    blocks: list[dict[str, Any]]
+    stacks: list[Stack]
+    tag_colors: list[TagColor]
+
+
 class TagMergeSuggestion(BaseModel):
     source: str
     target: str
@@ -351,6 +620,7 @@ class RelatedPromptResult(BaseModel):
     prompt: PromptBlock
     score: float
     reason: str
+    fresh: bool = True
 
 
 class RelatedPromptsResponse(BaseModel):
@@ -360,6 +630,13 @@ class RelatedPromptsResponse(BaseModel):
     results: list[RelatedPromptResult] = Field(default_factory=list)
 
 
+class RelatedNeighborsResponse(BaseModel):
+    prompt_id: str
+    fresh: bool = False
+    computed_at: Optional[datetime] = None
+    results: list[RelatedPromptResult] = Field(default_factory=list)
+
+
 class PromptInsight(BaseModel):
     prompt_id: str
     content_hash: str
@@ -374,11 +651,77 @@ class PromptInsight(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class InsightJobRequest(BaseModel):
+    prompt_ids: list[str] = Field(min_length=1)
+    kinds: list[InsightKind] = Field(min_length=1)
+
+
+class InsightJob(BaseModel):
+    id: str
+    prompt_id: str
+    content_hash: str
+    kind: InsightKind
+    status: InsightJobStatus
+    attempts: int = 0
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class InsightBatchRequest(BaseModel):
+    prompt_ids: Optional[list[str]] = None
+    stack_id: Optional[str] = None
+    kinds: list[InsightKind] = Field(min_length=1)
+
+
+class InsightMetrics(BaseModel):
+    calls: int
+    executions: int
+    coalesced: int
+    in_flight: int
+
+
+class ReadCacheMetrics(BaseModel):
+    enabled: bool
+    hits: int
+    misses: int
+    bypassed: int
+    invalidations: int
+    evictions: int
+    entries: int
+    bytes: int
+    max_bytes: int
+
+
+class FullTextWeights(BaseModel):
+    # ts_rank_cd rejects weights above 1 and ignores negative ones.
+    title: float = Field(1.0, ge=0, le=1)
+    tags: float = Field(0.6, ge=0, le=1)
+    keywords: float = Field(0.4, ge=0, le=1)
+    content: float = Field(0.2, ge=0, le=1)
+
+
+class InsightBatchItem(BaseModel):
+    prompt_id: str
+    computed: list[InsightKind] = Field(default_factory=list)
+    insight: PromptInsight
+
+
+class InsightBatchResponse(BaseModel):
+    results: list[InsightBatchItem] = Field(default_factory=list)
+
+
 class SemanticSearchRequest(BaseModel):
     query: str
     active_tags: list[str] = Field(default_factory=list)
+    tag_match: TagMatch = TagMatch.any
     stack_id: Optional[str] = None
     limit: int = 20
+    engine: Optional[SearchEngine] = None
+    weights: Optional[FullTextWeights] = None
 
 
 class SemanticSearchResult(BaseModel):
@@ -389,6 +732,8 @@ class SemanticSearchResult(BaseModel):
 
 class SemanticSearchResponse(BaseModel):
     query: str
+    engine: SearchEngine = SearchEngine.index
+    weights: Optional[FullTextWeights] = None
     results: list[SemanticSearchResult] = Field(default_factory=list)
 
 
@@ -2,35 +2,124 @@
 API routes for prompt blocks
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status, Request
+from collections import Counter
+from typing import Any, Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query, status, Request
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, update
+from sqlalchemy import String, column, select, delete, tuple_, update, values
 from ..database import get_db
 from ..models import (
+    BlockBulkRequest,
+    BlockBulkResponse,
+    BlockOperationResult,
     PromptBlock,
     PromptBlockCreate,
+    PromptBlockPage,
     PromptBlockUpdate,
     PromptBlockModel,
+    StackModel,
+    TagMatch,
 )
+from ..services.insights import index_new_prompt
+from ..services.lineage import add_to_lineage, move_in_lineage, remove_from_lineage
+from ..services.neighbors import drop_neighbors
+from ..services.read_cache import cached_collection, read_cache
+from ..services.snapshots import refresh_public_stack
+from ..services.render import render_cache
+from ..services.search_index import index_prompt, remove_prompt
+from .filters import tag_filter
+from .pagination import decode_cursor, encode_cursor
+from .projection import block_projection
+
+SEARCHABLE_FIELDS = {"title", "content", "tags"}
+MAX_BATCH_IDS = 500
+BLOCK_LIST = TypeAdapter(list[PromptBlock])
 
 router = APIRouter(prefix="/blocks", tags=["blocks"])
 
 
 @router.get("", response_model=list[PromptBlock])
-async def get_all_blocks(
-    request: Request, db: AsyncSession = Depends(get_db)
-):  # Request for rate limiter if needed later
+async def get_all_blocks(request: Request, db: AsyncSession = Depends(get_db)):
     """Get all prompt blocks."""
-    query = select(PromptBlockModel).order_by(PromptBlockModel.created_at.desc())
+
+    async def load() -> bytes:
+        query = select(PromptBlockModel).order_by(PromptBlockModel.created_at.desc())
+        result = await db.execute(query)
+        return BLOCK_LIST.dump_json(
+            BLOCK_LIST.validate_python(result.scalars().all(), from_attributes=True)
+        )
+
+    return await cached_collection(request, db, "blocks", "prompt_blocks", load)
+
+
+@router.get("/page", response_model=PromptBlockPage)
+async def get_blocks_page(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    fields: Optional[str] = Query(None, description="Comma-separated block fields to return"),
+    tags: Optional[str] = Query(None, description="Comma-separated tags to filter by"),
+    tag_match: TagMatch = TagMatch.any,
+    db: AsyncSession = Depends(get_db),
+):
+    """Page through blocks newest first, keyed on (created_at, id)."""
+    columns = block_projection(fields)
+    query_columns = list(dict.fromkeys([*columns, "created_at"]))
+    query = (
+        select(*(getattr(PromptBlockModel, name) for name in query_columns))
+        .order_by(PromptBlockModel.created_at.desc(), PromptBlockModel.id.desc())
+        .limit(limit + 1)
+    )
+    tag_list = [tag.strip() for tag in (tags or "").split(",") if tag.strip()]
+    if tag_list:
+        query = query.where(tag_filter(tag_list, tag_match))
+    if cursor:
+        created_at, block_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(PromptBlockModel.created_at, PromptBlockModel.id) < tuple_(created_at, block_id)
+        )
+
     result = await db.execute(query)
-    blocks = result.scalars().all()
-    return blocks
+    rows = result.mappings().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
 
+    return PromptBlockPage(
+        items=[{name: row[name] for name in columns} for row in rows],
+        next_cursor=next_cursor,
+    )
 
-@router.post("", response_model=PromptBlock, status_code=status.HTTP_201_CREATED)
-async def create_block(block: PromptBlockCreate, db: AsyncSession = Depends(get_db)):
-    """Create a new prompt block."""
-    new_block = PromptBlockModel(
+
+@router.get("/batch", response_model=list[dict[str, Any]])
+async def get_blocks_batch(
+    ids: str = Query(..., description="Comma-separated block ids"),
+    fields: Optional[str] = Query(None, description="Comma-separated block fields to return"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Fetch specific blocks in the requested order; unknown ids are skipped."""
+    requested = list(dict.fromkeys(item.strip() for item in ids.split(",") if item.strip()))
+    if not requested:
+        raise HTTPException(status_code=400, detail="No block ids provided")
+    if len(requested) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request"
+        )
+
+    columns = block_projection(fields)
+    result = await db.execute(
+        select(*(getattr(PromptBlockModel, name) for name in columns)).where(
+            PromptBlockModel.id.in_(requested)
+        )
+    )
+    by_id = {row["id"]: dict(row) for row in result.mappings().all()}
+    return [by_id[block_id] for block_id in requested if block_id in by_id]
+
+
+def _block_model(block: PromptBlockCreate) -> PromptBlockModel:
+    return PromptBlockModel(
         id=block.id,
         type=block.type.value,
         title=block.title,
@@ -43,8 +132,25 @@ async def create_block(block: PromptBlockCreate, db: AsyncSession = Depends(get_
         fork_note=block.fork_note,
         derived_from_stack_id=block.derived_from_stack_id,
     )
+
+
+def _update_values(updates: PromptBlockUpdate) -> dict[str, Any]:
+    update_data = updates.model_dump(exclude_unset=True)
+    if "type" in update_data:
+        update_data["type"] = update_data["type"].value
+    return update_data
+
+
+@router.post("", response_model=PromptBlock, status_code=status.HTTP_201_CREATED)
+async def create_block(block: PromptBlockCreate, db: AsyncSession = Depends(get_db)):
+    """Create a new prompt block."""
+    new_block = _block_model(block)
     db.add(new_block)
+    await index_new_prompt(db, new_block)
+    await add_to_lineage(db, new_block.id, new_block.parent_prompt_id)
     await db.commit()
+    read_cache.invalidate("blocks")
+    await refresh_public_stack(db, new_block.stack_id)
     await db.refresh(new_block)
     return new_block
 
@@ -62,16 +168,35 @@ async def update_block(
         raise HTTPException(status_code=404, detail="Block not found")
 
     # Update fields
-    update_data = updates.model_dump(exclude_unset=True)
-    if "type" in update_data:
-        update_data["type"] = update_data["type"].value
-    
+    update_data = _update_values(updates)
+
     if not update_data:
          return {"message": "No updates provided"}
 
+    previous_stack_id = block.stack_id
+
+    if (
+        "parent_prompt_id" in update_data
+        and update_data["parent_prompt_id"] != block.parent_prompt_id
+    ):
+        try:
+            await move_in_lineage(db, block_id, update_data["parent_prompt_id"])
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        # The move has already re-rooted the subtree from the closure.
+        update_data.pop("root_prompt_id", None)
+
     stmt = update(PromptBlockModel).where(PromptBlockModel.id == block_id).values(**update_data)
     await db.execute(stmt)
+    if SEARCHABLE_FIELDS & update_data.keys():
+        await index_prompt(db, block)
     await db.commit()
+    read_cache.invalidate("blocks")
+    if "content" in update_data:
+        render_cache.invalidate_prompt(block_id)
+    await refresh_public_stack(db, previous_stack_id)
+    if "stack_id" in update_data:
+        await refresh_public_stack(db, update_data["stack_id"])
 
     return {"message": "Block updated successfully"}
 
@@ -79,6 +204,164 @@ async def update_block(
 @router.delete("/{block_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_block(block_id: str, db: AsyncSession = Depends(get_db)):
     """Delete a prompt block."""
-    result = await db.execute(delete(PromptBlockModel).where(PromptBlockModel.id == block_id))
+    result = await db.execute(
+        delete(PromptBlockModel)
+        .where(PromptBlockModel.id == block_id)
+        .returning(PromptBlockModel.stack_id)
+    )
+    stack_id = result.scalar_one_or_none()
+    await remove_prompt(db, block_id)
+    await drop_neighbors(db, block_id)
+    await remove_from_lineage(db, block_id)
     await db.commit()
+    read_cache.invalidate("blocks")
+    render_cache.invalidate_prompt(block_id)
+    await refresh_public_stack(db, stack_id)
     return None
+
+
+def _parents_first(blocks: list[PromptBlockModel]) -> list[PromptBlockModel]:
+    pending = {block.id: block for block in blocks}
+    ordered = []
+    while pending:
+        ready = [block for block in pending.values() if block.parent_prompt_id not in pending]
+        if not ready:
+            raise HTTPException(status_code=400, detail="Created blocks form a parent cycle")
+        for block in ready:
+            ordered.append(block)
+            del pending[block.id]
+    return ordered
+
+
+def _values_update(fields: tuple[str, ...], rows: list[tuple[str, dict[str, Any]]]):
+    """One UPDATE ... FROM (VALUES ...) for blocks that change the same set of fields."""
+    table = PromptBlockModel.__table__
+    changes = values(
+        column("id", String),
+        *(column(name, table.c[name].type) for name in fields),
+        name="changes",
+    ).data([(block_id, *(data[name] for name in fields)) for block_id, data in rows])
+    return (
+        update(PromptBlockModel)
+        .where(PromptBlockModel.id == changes.c.id)
+        .values({name: changes.c[name] for name in fields})
+        .execution_options(synchronize_session=False)
+    )
+
+
+@router.post("/bulk", response_model=BlockBulkResponse)
+async def bulk_blocks(payload: BlockBulkRequest, db: AsyncSession = Depends(get_db)):
+    """Apply many creates, updates and deletes in one transaction.
+
+    The whole batch is validated first and rejected if any operation is invalid."""
+    operations = payload.operations
+    ids = [item.block.id if item.op == "create" else item.id for item in operations]
+    repeated = sorted(block_id for block_id, count in Counter(ids).items() if count > 1)
+    if repeated:
+        raise HTTPException(
+            status_code=400, detail=f"Blocks appear in more than one operation: {repeated}"
+        )
+
+    result = await db.execute(select(PromptBlockModel).where(PromptBlockModel.id.in_(ids)))
+    existing = {block.id: block for block in result.scalars().all()}
+
+    stack_refs: list[tuple[int, str]] = []
+    for index, item in enumerate(operations):
+        if item.op == "create":
+            if item.block.id in existing:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Operation {index}: block {item.block.id} already exists",
+                )
+            if item.block.stack_id:
+                stack_refs.append((index, item.block.stack_id))
+        else:
+            if item.id not in existing:
+                raise HTTPException(
+                    status_code=404, detail=f"Operation {index}: block {item.id} not found"
+                )
+            if item.op == "update" and item.changes.stack_id:
+                stack_refs.append((index, item.changes.stack_id))
+
+    if stack_refs:
+        result = await db.execute(
+            select(StackModel.id).where(StackModel.id.in_({stack_id for _, stack_id in stack_refs}))
+        )
+        known_stacks = set(result.scalars().all())
+        for index, stack_id in stack_refs:
+            if stack_id not in known_stacks:
+                raise HTTPException(
+                    status_code=400, detail=f"Operation {index}: stack {stack_id} not found"
+                )
+
+    # Captured before the updates below refresh the loaded blocks.
+    touched_stacks = {block.stack_id for block in existing.values()}
+
+    created = [_block_model(item.block) for item in operations if item.op == "create"]
+    db.add_all(created)
+    for block in _parents_first(created):
+        await index_new_prompt(db, block)
+        await add_to_lineage(db, block.id, block.parent_prompt_id)
+
+    groups: dict[tuple[str, ...], list[tuple[str, dict[str, Any]]]] = {}
+    reindex = []
+    for index, item in enumerate(operations):
+        if item.op != "update":
+            continue
+        update_data = _update_values(item.changes)
+        block = existing[item.id]
+        if (
+            "parent_prompt_id" in update_data
+            and update_data["parent_prompt_id"] != block.parent_prompt_id
+        ):
+            try:
+                await move_in_lineage(db, block.id, update_data["parent_prompt_id"])
+            except ValueError as exc:
+                raise HTTPException(
+                    status_code=400, detail=f"Operation {index}: {exc}"
+                ) from exc
+            update_data.pop("root_prompt_id", None)
+        if update_data:
+            groups.setdefault(tuple(sorted(update_data)), []).append((block.id, update_data))
+        if SEARCHABLE_FIELDS & update_data.keys():
+            reindex.append(block.id)
+
+    for fields, rows in groups.items():
+        await db.execute(_values_update(fields, rows))
+    if reindex:
+        result = await db.execute(
+            select(PromptBlockModel)
+            .where(PromptBlockModel.id.in_(reindex))
+            .execution_options(populate_existing=True)
+        )
+        for block in result.scalars().all():
+            await index_prompt(db, block)
+
+    deleted = [item.id for item in operations if item.op == "delete"]
+    if deleted:
+        await db.execute(delete(PromptBlockModel).where(PromptBlockModel.id.in_(deleted)))
+        for block_id in deleted:
+            await remove_prompt(db, block_id)
+            await remove_from_lineage(db, block_id)
+        for block_id in deleted:
+            await drop_neighbors(db, block_id)
+
+    await db.commit()
+    read_cache.invalidate("blocks")
+    for item in operations:
+        if item.op == "delete" or (
+            item.op == "update" and "content" in item.changes.model_fields_set
+        ):
+            render_cache.invalidate_prompt(item.id)
+    touched_stacks |= {block.stack_id for block in created}
+    touched_stacks |= {item.changes.stack_id for item in operations if item.op == "update"}
+    for stack_id in touched_stacks:
+        await refresh_public_stack(db, stack_id)
+
+    statuses = {"create": "created", "update": "updated", "delete": "deleted"}
+    return BlockBulkResponse(
+        results=[
+            BlockOperationResult(index=index, op=item.op, id=block_id, status=statuses[item.op])
+            for index, (item, block_id) in enumerate(zip(operations, ids))
+        ]
+    )
@@ -0,0 +1,56 @@
+"""
+Workspace bootstrap route.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_db
+from ..models import (
+    BootstrapResponse,
+    PromptBlockModel,
+    Stack,
+    StackModel,
+    TagColor,
+    TagColorModel,
+)
+from ..services.change_feed import sync_watermark
+from .projection import block_projection
+
+router = APIRouter(prefix="/bootstrap", tags=["bootstrap"])
+
+
+@router.get("", response_model=BootstrapResponse)
+async def bootstrap(
+    fields: Optional[str] = Query(None, description="Comma-separated block fields to return"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Everything the workspace needs on startup, read from one snapshot on one connection."""
+    columns = block_projection(fields)
+    # Every read below sees the same snapshot, and the watermark is taken from it:
+    # anything it does not show is newer than the watermark and is delivered by the
+    # next /sync, so nothing falls between the two.
+    await db.connection(
+        execution_options={"isolation_level": "REPEATABLE READ", "postgresql_readonly": True}
+    )
+    watermark = await sync_watermark(db)
+
+    result = await db.execute(
+        select(*(getattr(PromptBlockModel, name) for name in columns)).order_by(
+            PromptBlockModel.created_at.desc()
+        )
+    )
+    blocks = [dict(row) for row in result.mappings().all()]
+    result = await db.execute(select(StackModel).order_by(StackModel.created_at.asc()))
+    stacks = [Stack.model_validate(stack) for stack in result.scalars().all()]
+    result = await db.execute(select(TagColorModel))
+    tag_colors = [TagColor.model_validate(color) for color in result.scalars().all()]
+
+    return BootstrapResponse(
+        watermark=watermark, blocks=blocks, stacks=stacks, tag_colors=tag_colors
+    )
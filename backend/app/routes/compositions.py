@@ -4,8 +4,11 @@ Composition routes.
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import delete, select
+from collections import Counter
+from typing import Optional, Sequence
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -15,19 +18,54 @@ from ..models import (
     CompositionCreate,
     CompositionItem,
     CompositionItemModel,
+    CompositionItemUpdate,
     CompositionModel,
+    CompositionPage,
+    CompositionRender,
+    CompositionSummary,
+    CompositionSummaryPage,
     PromptBlock,
     PromptBlockModel,
     CompositionUpdate,
+    RenderPreset,
 )
+from ..services.etags import Validators, composition_validators, table_validators
+from ..services.render import render_cache, render_composition
+from .pagination import decode_cursor, encode_cursor
+
+# The listing embeds each item's prompt, so prompt edits change it too.
+COMPOSITION_TABLES = ("compositions", "composition_items", "prompt_blocks")
 
 router = APIRouter(prefix="/compositions", tags=["compositions"])
 
 
-async def _serialize_composition(
-    db: AsyncSession, composition: CompositionModel
-) -> Composition:
-    source_ids = [item.source_prompt_id for item in composition.items if item.source_prompt_id]
+def _composition_query():
+    return select(CompositionModel).options(selectinload(CompositionModel.items))
+
+
+def _keyset_order():
+    return CompositionModel.updated_at.desc(), CompositionModel.id.desc()
+
+
+def _after_cursor(query, cursor: Optional[str]):
+    if not cursor:
+        return query
+    updated_at, composition_id = decode_cursor(cursor)
+    return query.where(
+        tuple_(CompositionModel.updated_at, CompositionModel.id) < tuple_(updated_at, composition_id)
+    )
+
+
+async def _serialize_compositions(
+    db: AsyncSession, compositions: Sequence[CompositionModel]
+) -> list[Composition]:
+    """Serialize compositions with one query for all the prompts their items reference."""
+    source_ids = {
+        item.source_prompt_id
+        for composition in compositions
+        for item in composition.items
+        if item.source_prompt_id
+    }
     prompts_by_id: dict[str, PromptBlock] = {}
     if source_ids:
         result = await db.execute(
@@ -38,40 +76,172 @@ async def _serialize_composition(
             for prompt in result.scalars().all()
         }
 
-    items = []
-    for item in composition.items:
-        payload = CompositionItem.model_validate(item).model_dump()
-        if item.source_prompt_id:
-            payload["prompt"] = prompts_by_id.get(item.source_prompt_id)
-        items.append(CompositionItem(**payload))
+    return [
+        Composition(
+            id=composition.id,
+            name=composition.name,
+            description=composition.description,
+            source_stack_id=composition.source_stack_id,
+            created_at=composition.created_at,
+            updated_at=composition.updated_at,
+            items=[
+                CompositionItem(
+                    id=item.id,
+                    composition_id=item.composition_id,
+                    source_prompt_id=item.source_prompt_id,
+                    kind=item.kind,
+                    content=item.content,
+                    section=item.section,
+                    position=item.position,
+                    label=item.label,
+                    prompt=prompts_by_id.get(item.source_prompt_id)
+                    if item.source_prompt_id
+                    else None,
+                )
+                for item in composition.items
+            ],
+        )
+        for composition in compositions
+    ]
 
-    data = Composition.model_validate(composition).model_dump()
-    data["items"] = items
-    return Composition(**data)
+
+async def list_compositions(db: AsyncSession) -> list[Composition]:
+    result = await db.execute(_composition_query().order_by(*_keyset_order()))
+    return await _serialize_compositions(db, result.scalars().unique().all())
 
 
 @router.get("", response_model=list[Composition])
-async def get_compositions(db: AsyncSession = Depends(get_db)):
+async def get_compositions(
+    request: Request, response: Response, db: AsyncSession = Depends(get_db)
+):
+    validators = await table_validators(db, *COMPOSITION_TABLES)
+    if validators.matches(request):
+        return validators.not_modified()
+    validators.apply(response)
+    return await list_compositions(db)
+
+
+@router.get("/page", response_model=CompositionPage)
+async def get_compositions_page(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db),
+):
+    """Page through compositions most recently updated first, keyed on (updated_at, id)."""
+    validators = await table_validators(db, *COMPOSITION_TABLES)
+    if validators.matches(request):
+        return validators.not_modified()
+    validators.apply(response)
+
     result = await db.execute(
-        select(CompositionModel)
-        .options(selectinload(CompositionModel.items))
-        .order_by(CompositionModel.updated_at.desc())
+        _after_cursor(_composition_query(), cursor).order_by(*_keyset_order()).limit(limit + 1)
     )
     compositions = result.scalars().unique().all()
-    return [await _serialize_composition(db, composition) for composition in compositions]
+    next_cursor = None
+    if len(compositions) > limit:
+        compositions = compositions[:limit]
+        next_cursor = encode_cursor(compositions[-1].updated_at, compositions[-1].id)
+    return CompositionPage(
+        items=await _serialize_compositions(db, compositions), next_cursor=next_cursor
+    )
 
 
-@router.get("/{composition_id}", response_model=Composition)
-async def get_composition(composition_id: str, db: AsyncSession = Depends(get_db)):
+@router.get("/summaries", response_model=CompositionSummaryPage)
+async def get_composition_summaries(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+):
+    """Composition headers with item counts, without item bodies or embedded prompts."""
+    validators = await table_validators(db, "compositions", "composition_items")
+    if validators.matches(request):
+        return validators.not_modified()
+    validators.apply(response)
+
+    item_counts = (
+        select(
+            CompositionItemModel.composition_id,
+            func.count().label("item_count"),
+        )
+        .group_by(CompositionItemModel.composition_id)
+        .subquery()
+    )
+    query = (
+        select(
+            CompositionModel.id,
+            CompositionModel.name,
+            CompositionModel.description,
+            CompositionModel.source_stack_id,
+            CompositionModel.created_at,
+            CompositionModel.updated_at,
+            func.coalesce(item_counts.c.item_count, 0).label("item_count"),
+        )
+        .outerjoin(item_counts, item_counts.c.composition_id == CompositionModel.id)
+        .order_by(*_keyset_order())
+        .limit(limit + 1)
+    )
+    result = await db.execute(_after_cursor(query, cursor))
+    rows = result.mappings().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["updated_at"], rows[-1]["id"])
+    return CompositionSummaryPage(
+        items=[CompositionSummary(**row) for row in rows], next_cursor=next_cursor
+    )
+
+
+async def _load_composition(db: AsyncSession, composition_id: str) -> Composition:
     result = await db.execute(
         select(CompositionModel)
         .where(CompositionModel.id == composition_id)
         .options(selectinload(CompositionModel.items))
+        .execution_options(populate_existing=True)
     )
     composition = result.scalar_one_or_none()
     if not composition:
         raise HTTPException(status_code=404, detail="Composition not found")
-    return await _serialize_composition(db, composition)
+    return (await _serialize_compositions(db, [composition]))[0]
+
+
+@router.get("/{composition_id}", response_model=Composition)
+async def get_composition(
+    composition_id: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    validators = await composition_validators(db, composition_id)
+    if validators is not None:
+        if validators.matches(request):
+            return validators.not_modified()
+        validators.apply(response)
+    return await _load_composition(db, composition_id)
+
+
+@router.get("/{composition_id}/render", response_model=CompositionRender)
+async def render_composition_text(
+    composition_id: str,
+    request: Request,
+    response: Response,
+    preset: RenderPreset = RenderPreset.chatgpt,
+    db: AsyncSession = Depends(get_db),
+):
+    """Compile the composition section by section, with prompt items using live prompt text."""
+    rendered = await render_composition(db, composition_id, preset)
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="Composition not found")
+    key, text, cached = rendered
+
+    validators = Validators(etag=f'"{key}"')
+    if validators.matches(request):
+        return validators.not_modified()
+    validators.apply(response)
+    return CompositionRender(composition_id=composition_id, preset=preset, text=text, cached=cached)
 
 
 @router.post("", response_model=Composition, status_code=status.HTTP_201_CREATED)
@@ -101,7 +271,58 @@ async def create_composition(
         )
 
     await db.commit()
-    return await get_composition(payload.id, db)
+    return await _load_composition(db, payload.id)
+
+
+ITEM_FIELDS = ("source_prompt_id", "kind", "content", "section", "position", "label")
+
+
+async def _apply_item_diff(
+    db: AsyncSession, composition: CompositionModel, items: list[CompositionItemUpdate]
+) -> bool:
+    """Bring the composition's items in line with ``items`` by id.
+
+    Only rows that were added, removed or actually changed are written, and an update
+    only sets the columns that differ. Returns whether anything changed."""
+    counts = Counter(item.id for item in items)
+    repeated = sorted(item_id for item_id, count in counts.items() if count > 1)
+    if repeated:
+        raise HTTPException(status_code=400, detail=f"Duplicate item ids: {repeated}")
+
+    existing = {item.id: item for item in composition.items}
+    added = [item for item in items if item.id not in existing]
+    if added:
+        result = await db.execute(
+            select(CompositionItemModel.id).where(
+                CompositionItemModel.id.in_([item.id for item in added])
+            )
+        )
+        taken = sorted(result.scalars().all())
+        if taken:
+            raise HTTPException(
+                status_code=409, detail=f"Items belong to another composition: {taken}"
+            )
+
+    changed = False
+    kept = []
+    for item in items:
+        values = item.model_dump(include=set(ITEM_FIELDS), mode="json")
+        row = existing.get(item.id)
+        if row is None:
+            row = CompositionItemModel(id=item.id, composition_id=composition.id, **values)
+            changed = True
+        else:
+            for name, value in values.items():
+                if getattr(row, name) != value:
+                    setattr(row, name, value)
+                    changed = True
+        kept.append(row)
+
+    if len(kept) - len(added) != len(existing):
+        changed = True
+    # delete-orphan removes the rows that are no longer in the list.
+    composition.items = kept
+    return changed
 
 
 @router.patch("/{composition_id}", response_model=Composition)
@@ -117,31 +338,13 @@ async def update_composition(
     if not composition:
         raise HTTPException(status_code=404, detail="Composition not found")
 
-    updates = payload.model_dump(exclude_unset=True)
-    items = updates.pop("items", None)
-
+    updates = payload.model_dump(exclude_unset=True, exclude={"items"})
     for key, value in updates.items():
         setattr(composition, key, value)
 
-    if items is not None:
-        await db.execute(
-            delete(CompositionItemModel).where(
-                CompositionItemModel.composition_id == composition_id
-            )
-        )
-        for item in items:
-            db.add(
-                CompositionItemModel(
-                    id=item["id"],
-                    composition_id=composition_id,
-                    source_prompt_id=item.get("source_prompt_id"),
-                    kind=item["kind"].value if hasattr(item["kind"], "value") else item["kind"],
-                    content=item.get("content", ""),
-                    section=item["section"].value if hasattr(item["section"], "value") else item["section"],
-                    position=item.get("position", 0),
-                    label=item.get("label"),
-                )
-            )
+    if payload.items is not None and await _apply_item_diff(db, composition, payload.items):
+        composition.updated_at = func.now()
+        render_cache.invalidate_composition(composition_id)
 
     await db.commit()
-    return await get_composition(composition_id, db)
+    return await _load_composition(db, composition_id)
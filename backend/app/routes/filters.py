@@ -0,0 +1,16 @@
+"""
+Query conditions shared by the block listing and search routes.
+"""
+
+from __future__ import annotations
+
+from sqlalchemy.dialects.postgresql import array
+
+from ..models import PromptBlockModel, TagMatch
+
+
+def tag_filter(tags: list[str], match: TagMatch = TagMatch.any):
+    """Overlap (?|) or containment (@>) on the JSONB tags; both use the GIN index."""
+    if match == TagMatch.all:
+        return PromptBlockModel.tags.contains(tags)
+    return PromptBlockModel.tags.has_any(array(tags))
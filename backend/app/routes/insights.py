@@ -4,22 +4,38 @@ AI-assisted prompt insight routes.
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database import get_db
 from ..models import (
+    InsightBatchItem,
+    InsightBatchRequest,
+    InsightBatchResponse,
+    InsightJob,
+    InsightJobRequest,
+    InsightMetrics,
     PromptBlock,
     PromptBlockModel,
+    PromptInsight,
     QualityScorecard,
+    RelatedNeighborsResponse,
     RelatedPromptResult,
     RelatedPromptsResponse,
     SemanticProfile,
     TagMergeSuggestion,
     TagSuggestionResponse,
 )
-from ..services.insights import ensure_insight, fallback_profile, semantic_similarity
+from ..services.insights import (
+    batch_insights,
+    ensure_insight,
+    insight_flight,
+    load_existing_tags,
+    refresh_related,
+)
+from ..services.jobs import enqueue_jobs, get_job, worker_pool
+from ..services.neighbors import read_neighbors
 
 router = APIRouter(prefix="/insights", tags=["insights"])
 
@@ -35,15 +51,7 @@ async def _get_prompt(prompt_id: str, db: AsyncSession) -> PromptBlockModel:
 @router.post("/prompts/{prompt_id}/tags", response_model=TagSuggestionResponse)
 async def suggest_prompt_tags(prompt_id: str, db: AsyncSession = Depends(get_db)):
     prompt = await _get_prompt(prompt_id, db)
-    all_tags_result = await db.execute(select(PromptBlockModel.tags))
-    existing_tags = sorted(
-        {
-            tag
-            for tag_list in all_tags_result.scalars().all()
-            for tag in (tag_list or [])
-            if isinstance(tag, str)
-        }
-    )
+    existing_tags = await load_existing_tags(db)
     row, cached = await ensure_insight(
         db, prompt, update_tags=True, existing_tags=existing_tags
     )
@@ -72,30 +80,7 @@ async def analyze_prompt_quality(prompt_id: str, db: AsyncSession = Depends(get_
 @router.post("/prompts/{prompt_id}/related", response_model=RelatedPromptsResponse)
 async def find_related_prompts(prompt_id: str, db: AsyncSession = Depends(get_db)):
     prompt = await _get_prompt(prompt_id, db)
-    row, cached = await ensure_insight(db, prompt, update_semantic=True)
-    source_profile = row.semantic_profile or fallback_profile(prompt)
-
-    result = await db.execute(select(PromptBlockModel).where(PromptBlockModel.id != prompt.id))
-    candidates = result.scalars().all()
-
-    scored = []
-    for candidate in candidates:
-        candidate_row = await ensure_insight(db, candidate, update_semantic=False)
-        candidate_profile = (
-            candidate_row[0].semantic_profile
-            if candidate_row and candidate_row[0].semantic_profile
-            else fallback_profile(candidate)
-        )
-        score, reason = semantic_similarity(source_profile, candidate_profile)
-        if score <= 0:
-            continue
-        scored.append((score, reason, candidate))
-
-    scored.sort(key=lambda item: item[0], reverse=True)
-    top = scored[:6]
-    row.related_prompt_ids = [candidate.id for _, _, candidate in top]
-    await db.commit()
-    await db.refresh(row)
+    _, cached, source_profile, top = await refresh_related(db, prompt)
 
     return RelatedPromptsResponse(
         prompt_id=prompt.id,
@@ -110,3 +95,87 @@ async def find_related_prompts(prompt_id: str, db: AsyncSession = Depends(get_db
             for score, reason, candidate in top
         ],
     )
+
+
+@router.get("/prompts/{prompt_id}/related", response_model=RelatedNeighborsResponse)
+async def get_related_prompts(prompt_id: str, db: AsyncSession = Depends(get_db)):
+    """Serve the stored neighbour list without recomputing it."""
+    stored = await read_neighbors(db, prompt_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+
+    return RelatedNeighborsResponse(
+        prompt_id=prompt_id,
+        fresh=stored.fresh,
+        computed_at=stored.computed_at,
+        results=[
+            RelatedPromptResult(
+                prompt=PromptBlock.model_validate(candidate),
+                score=round(score, 3),
+                reason=reason,
+                fresh=fresh,
+            )
+            for score, reason, fresh, candidate in stored.entries
+        ],
+    )
+
+
+@router.post("/batch", response_model=InsightBatchResponse)
+async def analyze_prompts_batch(
+    payload: InsightBatchRequest, db: AsyncSession = Depends(get_db)
+):
+    if (payload.prompt_ids is None) == (payload.stack_id is None):
+        raise HTTPException(status_code=400, detail="Provide either prompt_ids or stack_id")
+
+    query = select(PromptBlockModel)
+    if payload.stack_id is not None:
+        query = query.where(PromptBlockModel.stack_id == payload.stack_id).order_by(
+            PromptBlockModel.stack_order.asc().nulls_last(), PromptBlockModel.created_at.desc()
+        )
+    else:
+        query = query.where(PromptBlockModel.id.in_(payload.prompt_ids))
+    result = await db.execute(query)
+    prompts = result.scalars().all()
+    if payload.prompt_ids is not None:
+        order = {prompt_id: index for index, prompt_id in enumerate(payload.prompt_ids)}
+        prompts = sorted(prompts, key=lambda prompt: order[prompt.id])
+
+    summary = await batch_insights(db, prompts, payload.kinds)
+    return InsightBatchResponse(
+        results=[
+            InsightBatchItem(
+                prompt_id=row.prompt_id,
+                computed=computed,
+                insight=PromptInsight.model_validate(row),
+            )
+            for row, computed in summary
+        ]
+    )
+
+
+@router.post("/jobs", response_model=list[InsightJob], status_code=status.HTTP_202_ACCEPTED)
+async def create_insight_jobs(payload: InsightJobRequest, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(PromptBlockModel).where(PromptBlockModel.id.in_(payload.prompt_ids))
+    )
+    prompts = result.scalars().all()
+    missing = set(payload.prompt_ids) - {prompt.id for prompt in prompts}
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Prompt not found: {sorted(missing)[0]}")
+
+    jobs = await enqueue_jobs(db, prompts, payload.kinds)
+    worker_pool.notify()
+    return jobs
+
+
+@router.get("/jobs/{job_id}", response_model=InsightJob)
+async def get_insight_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    job = await get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/metrics", response_model=InsightMetrics)
+async def get_insight_metrics():
+    return InsightMetrics(**insight_flight.snapshot())
@@ -0,0 +1,25 @@
+"""
+Opaque keyset cursors, shared by the blocks and compositions page routes.
+"""
+
+from __future__ import annotations
+
+import base64
+from datetime import datetime
+
+from fastapi import HTTPException
+
+
+def encode_cursor(timestamp: datetime, row_id: str) -> str:
+    """Cursor for the row after which the next page starts."""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """The (timestamp, id) key of a cursor; a malformed one is a 400."""
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(timestamp), row_id
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
@@ -0,0 +1,25 @@
+"""
+Sparse field selection for prompt block reads, shared by the blocks and bootstrap routes.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import HTTPException
+
+from ..models import PromptBlock
+
+BLOCK_FIELDS = tuple(PromptBlock.model_fields)
+
+
+def block_projection(fields: Optional[str]) -> list[str]:
+    """Columns for a comma-separated ``fields`` parameter, always including ``id``; all
+    fields when it is empty. Unknown names are a 400."""
+    if not fields:
+        return list(BLOCK_FIELDS)
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(requested) - set(BLOCK_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(["id", *requested]))
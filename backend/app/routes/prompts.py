@@ -4,52 +4,145 @@ Prompt lineage and fork routes.
 
 from __future__ import annotations
 
+from typing import Optional
 from uuid import uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import String, any_, func, literal, not_, select
+from sqlalchemy.dialects.postgresql import array
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
 from ..database import get_db
 from ..models import (
+    FamilyTreeNode,
+    FamilyTreeResponse,
     ForkPromptRequest,
     LineageResponse,
     PromptBlock,
     PromptBlockModel,
 )
+from ..services.insights import index_new_prompt
+from ..services.lineage import add_to_lineage, load_family
+from ..services.read_cache import read_cache
+from ..services.snapshots import refresh_public_stack
 
 router = APIRouter(prefix="/prompts", tags=["prompts"])
 
 
+def _ancestors_cte(prompt_id: str, max_depth: int | None):
+    seed = select(
+        PromptBlockModel.parent_prompt_id.label("id"),
+        literal(1).label("depth"),
+        array([PromptBlockModel.id]).label("path"),
+    ).where(
+        PromptBlockModel.id == prompt_id,
+        PromptBlockModel.parent_prompt_id.is_not(None),
+        PromptBlockModel.parent_prompt_id != PromptBlockModel.id,
+    )
+    tree = seed.cte("ancestors", recursive=True)
+
+    parent = aliased(PromptBlockModel)
+    step = select(
+        parent.parent_prompt_id,
+        tree.c.depth + 1,
+        tree.c.path.op("||")(parent.id),
+    ).where(
+        parent.id == tree.c.id,
+        parent.parent_prompt_id.is_not(None),
+        # Guards against cycles introduced by re-parenting. The path does not hold the
+        # current node yet, so a self-referencing parent would otherwise repeat it.
+        not_(parent.parent_prompt_id == any_(tree.c.path.op("||")(parent.id))),
+    )
+    if max_depth is not None:
+        step = step.where(tree.c.depth < max_depth)
+    return tree.union_all(step)
+
+
+def _descendants_cte(prompt_id: str, max_depth: int | None):
+    seed = select(
+        PromptBlockModel.id.label("id"),
+        literal(1).label("depth"),
+        array([literal(prompt_id, String), PromptBlockModel.id]).label("path"),
+    ).where(PromptBlockModel.parent_prompt_id == prompt_id, PromptBlockModel.id != prompt_id)
+    tree = seed.cte("descendants", recursive=True)
+
+    child = aliased(PromptBlockModel)
+    step = select(
+        child.id,
+        tree.c.depth + 1,
+        tree.c.path.op("||")(child.id),
+    ).where(child.parent_prompt_id == tree.c.id, not_(child.id == any_(tree.c.path)))
+    if max_depth is not None:
+        step = step.where(tree.c.depth < max_depth)
+    return tree.union_all(step)
+
+
 @router.get("/{prompt_id}/lineage", response_model=LineageResponse)
-async def get_prompt_lineage(prompt_id: str, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(PromptBlockModel))
-    blocks = result.scalars().all()
-    block_map = {block.id: block for block in blocks}
-    prompt = block_map.get(prompt_id)
+async def get_prompt_lineage(
+    prompt_id: str,
+    max_depth: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    """Ancestors root-first and descendants breadth-first. Descendants are only paged
+    when ``limit`` is given; ``truncated`` says whether more follow the returned page."""
+    result = await db.execute(select(PromptBlockModel).where(PromptBlockModel.id == prompt_id))
+    prompt = result.scalar_one_or_none()
 
     if not prompt:
         raise HTTPException(status_code=404, detail="Prompt not found")
 
-    ancestors = []
-    cursor = prompt
-    while cursor.parent_prompt_id and cursor.parent_prompt_id in block_map:
-        parent = block_map[cursor.parent_prompt_id]
-        ancestors.insert(0, parent)
-        cursor = parent
-
-    descendants = []
-    frontier = [prompt.id]
-    while frontier:
-        current_id = frontier.pop(0)
-        children = [block for block in blocks if block.parent_prompt_id == current_id]
-        descendants.extend(children)
-        frontier.extend(child.id for child in children)
+    ancestors_tree = _ancestors_cte(prompt_id, max_depth)
+    result = await db.execute(
+        select(PromptBlockModel)
+        .join(ancestors_tree, ancestors_tree.c.id == PromptBlockModel.id)
+        .order_by(ancestors_tree.c.depth.desc())
+    )
+    ancestors = result.scalars().all()
+
+    descendants_tree = _descendants_cte(prompt_id, max_depth)
+    result = await db.execute(
+        select(PromptBlockModel)
+        .join(descendants_tree, descendants_tree.c.id == PromptBlockModel.id)
+        .order_by(
+            descendants_tree.c.depth, PromptBlockModel.created_at, PromptBlockModel.id
+        )
+        .offset(offset)
+        .limit(limit)
+    )
+    descendants = result.scalars().all()
+    total_descendants = await db.scalar(select(func.count()).select_from(descendants_tree))
 
     return LineageResponse(
         prompt=PromptBlock.model_validate(prompt),
         ancestors=[PromptBlock.model_validate(item) for item in ancestors],
         descendants=[PromptBlock.model_validate(item) for item in descendants],
+        total_descendants=total_descendants,
+        truncated=offset + len(descendants) < total_descendants,
+    )
+
+
+@router.get("/{prompt_id}/family", response_model=FamilyTreeResponse)
+async def get_prompt_family(prompt_id: str, db: AsyncSession = Depends(get_db)):
+    """The whole fork family containing a prompt, rooted at its topmost ancestor."""
+    nodes = await load_family(db, prompt_id)
+    if not nodes:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+
+    return FamilyTreeResponse(
+        root_prompt_id=nodes[0][0].id,
+        size=len(nodes),
+        nodes=[
+            FamilyTreeNode(
+                prompt=PromptBlock.model_validate(prompt),
+                depth=depth,
+                child_count=child_count,
+                subtree_size=subtree_size,
+            )
+            for prompt, depth, child_count, subtree_size in nodes
+        ],
     )
 
 
@@ -78,6 +171,10 @@ async def fork_prompt(
         derived_from_stack_id=source.stack_id,
     )
     db.add(fork)
+    await index_new_prompt(db, fork)
+    await add_to_lineage(db, fork.id, source.id)
     await db.commit()
+    read_cache.invalidate("blocks")
+    await refresh_public_stack(db, fork.stack_id)
     await db.refresh(fork)
     return fork
@@ -2,32 +2,35 @@
 Public read-only routes.
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database import get_db
-from ..models import PromptBlock, PromptBlockModel, PublicStackResponse, Stack, StackModel
+from ..models import PublicStackResponse
+from ..services.public_cache import build_page, load_public_stack, public_cache
 
 router = APIRouter(prefix="/public", tags=["public"])
 
 
 @router.get("/stacks/{slug}", response_model=PublicStackResponse)
-async def get_public_stack(slug: str, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(StackModel).where(StackModel.slug == slug))
-    stack = result.scalar_one_or_none()
-
-    if not stack or not stack.is_published:
-        raise HTTPException(status_code=404, detail="Published stack not found")
-
-    prompts_result = await db.execute(
-        select(PromptBlockModel)
-        .where(PromptBlockModel.stack_id == stack.id)
-        .order_by(PromptBlockModel.stack_order.asc().nulls_last(), PromptBlockModel.created_at.desc())
-    )
-    prompts = prompts_result.scalars().all()
-
-    return PublicStackResponse(
-        stack=Stack.model_validate(stack),
-        prompts=[PromptBlock.model_validate(prompt) for prompt in prompts],
-    )
+async def get_public_stack(slug: str, request: Request, db: AsyncSession = Depends(get_db)):
+    """Served from the in-process page cache; a hot slug costs no database queries."""
+    page = public_cache.get(slug)
+    if page is None:
+        generation = public_cache.generation
+        payload = await load_public_stack(db, slug)
+        if payload is None:
+            raise HTTPException(status_code=404, detail="Published stack not found")
+        page = await build_page(payload.stack.id, payload.model_dump_json().encode("utf-8"))
+        public_cache.put(slug, page, generation)
+
+    if page.validators.matches(request):
+        response = page.validators.not_modified()
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    encoding, body = page.negotiate(request.headers.get("accept-encoding", ""))
+    headers = {**page.validators.headers(), "Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -4,55 +4,140 @@ Semantic search routes.
 
 from __future__ import annotations
 
+import os
+import re
+
 from fastapi import APIRouter, Depends
-from sqlalchemy import select
+from sqlalchemy import REAL, cast, func, select
+from sqlalchemy.dialects.postgresql import ARRAY, array
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database import get_db
-from ..models import PromptBlockModel, SemanticSearchRequest, SemanticSearchResponse, SemanticSearchResult
-from ..services.insights import fallback_profile, get_insight_row, semantic_similarity
+from ..models import (
+    FullTextWeights,
+    PromptBlockModel,
+    SearchEngine,
+    SemanticSearchRequest,
+    SemanticSearchResponse,
+    SemanticSearchResult,
+)
+from ..services.embeddings import embed_profile, vector_index
+from ..services.neighbors import load_profiles, semantic_similarity
 from ..services.openrouter import extract_keywords
+from ..services.search_index import lookup_postings, normalize_term, profile_terms
+from .filters import tag_filter
 
 router = APIRouter(prefix="/search", tags=["search"])
 
+DEFAULT_SEARCH_ENGINE = SearchEngine(os.getenv("SEARCH_ENGINE", SearchEngine.index.value))
 
-@router.post("/semantic", response_model=SemanticSearchResponse)
-async def semantic_search(
-    payload: SemanticSearchRequest, db: AsyncSession = Depends(get_db)
-):
-    query = payload.query.strip()
-    query_terms = set(extract_keywords(query, limit=12))
-    if not query_terms and query:
-        query_terms = {part.lower() for part in query.split() if part.strip()}
 
-    result = await db.execute(select(PromptBlockModel))
+def _tsquery_text(query_terms: set[str]) -> str:
+    words = {
+        word
+        for term in query_terms
+        for word in re.sub(r"[^a-z0-9]+", " ", term.lower()).split()
+    }
+    return " | ".join(sorted(words))
+
+
+def _query_profile(query: str, query_terms: set[str]) -> dict:
+    return {
+        "intent": query,
+        "output_style": "search",
+        "keywords": list(query_terms),
+        "constraints": [],
+        "personas": [],
+    }
+
+
+async def _fulltext_search(
+    db: AsyncSession,
+    payload: SemanticSearchRequest,
+    query_terms: set[str],
+    weights: FullTextWeights,
+) -> list[SemanticSearchResult]:
+    tsquery_text = _tsquery_text(query_terms)
+    if not tsquery_text:
+        return []
+
+    tsquery = func.to_tsquery("english", tsquery_text)
+    # ts_rank_cd takes weights ordered {D, C, B, A}; normalization 32 maps rank into 0..1.
+    rank_weights = cast(
+        array([weights.content, weights.keywords, weights.tags, weights.title]), ARRAY(REAL)
+    )
+    rank = func.ts_rank_cd(rank_weights, PromptBlockModel.search_vector, tsquery, 32)
+
+    statement = (
+        select(PromptBlockModel.id, rank.label("rank"))
+        .where(PromptBlockModel.search_vector.op("@@")(tsquery))
+        .order_by(rank.desc(), PromptBlockModel.created_at.desc())
+        .limit(payload.limit)
+    )
+    if payload.stack_id:
+        statement = statement.where(PromptBlockModel.stack_id == payload.stack_id)
+    if payload.active_tags:
+        statement = statement.where(tag_filter(payload.active_tags, payload.tag_match))
+
+    result = await db.execute(statement)
+    return [
+        SemanticSearchResult(prompt_id=prompt_id, score=round(score, 3), reason="full-text match")
+        for prompt_id, score in result.all()
+    ]
+
+
+async def _vector_search(
+    db: AsyncSession, payload: SemanticSearchRequest, query: str, query_terms: set[str]
+) -> list[SemanticSearchResult]:
+    # Over-fetch so the stack and tag filters still leave enough results.
+    neighbours = vector_index.search(
+        embed_profile(_query_profile(query, query_terms)), payload.limit * 4
+    )
+    if not neighbours:
+        return []
+
+    statement = select(PromptBlockModel.id).where(
+        PromptBlockModel.id.in_([prompt_id for prompt_id, _ in neighbours])
+    )
+    if payload.stack_id:
+        statement = statement.where(PromptBlockModel.stack_id == payload.stack_id)
+    if payload.active_tags:
+        statement = statement.where(tag_filter(payload.active_tags, payload.tag_match))
+    result = await db.execute(statement)
+    allowed = set(result.scalars().all())
+
+    return [
+        SemanticSearchResult(prompt_id=prompt_id, score=round(score, 3), reason="embedding neighbour")
+        for prompt_id, score in neighbours
+        if prompt_id in allowed and score > 0
+    ][: payload.limit]
+
+
+async def _index_search(
+    db: AsyncSession, payload: SemanticSearchRequest, query: str, query_terms: set[str]
+) -> list[SemanticSearchResult]:
+    query_profile = _query_profile(query, query_terms)
+    lexical_terms = {normalize_term(term) for term in query_terms}
+    matches = await lookup_postings(db, lexical_terms | profile_terms(query_profile))
+    if not matches:
+        return []
+
+    prompts_query = select(PromptBlockModel).where(PromptBlockModel.id.in_(matches.keys()))
+    if payload.stack_id:
+        prompts_query = prompts_query.where(PromptBlockModel.stack_id == payload.stack_id)
+    if payload.active_tags:
+        prompts_query = prompts_query.where(tag_filter(payload.active_tags, payload.tag_match))
+    result = await db.execute(prompts_query)
     prompts = result.scalars().all()
 
-    filtered = []
-    for prompt in prompts:
-        if payload.stack_id and prompt.stack_id != payload.stack_id:
-            continue
-        if payload.active_tags and not any(tag in payload.active_tags for tag in (prompt.tags or [])):
-            continue
-        filtered.append(prompt)
+    profiles = await load_profiles(db, prompts)
 
     ranked = []
-    for prompt in filtered:
-        haystack = " ".join(
-            [prompt.title.lower(), prompt.content.lower(), " ".join((prompt.tags or []))]
-        )
-        lexical_hits = sum(1 for term in query_terms if term in haystack)
+    for prompt in prompts:
+        lexical_hits = len(matches[prompt.id] & lexical_terms)
         lexical_score = min(1.0, lexical_hits * 0.2)
 
-        row = await get_insight_row(db, prompt.id)
-        profile = row.semantic_profile if row and row.semantic_profile else fallback_profile(prompt)
-        query_profile = {
-            "intent": query,
-            "output_style": "search",
-            "keywords": list(query_terms),
-            "constraints": [],
-            "personas": [],
-        }
+        profile = profiles[prompt.id]
         semantic_score, reason = semantic_similarity(query_profile, profile, query_terms)
         total = lexical_score + semantic_score
         if total <= 0:
@@ -60,9 +145,32 @@ async def semantic_search(
         ranked.append((total, reason, prompt.id))
 
     ranked.sort(key=lambda item: item[0], reverse=True)
-    results = [
+    return [
         SemanticSearchResult(prompt_id=prompt_id, score=round(score, 3), reason=reason)
         for score, reason, prompt_id in ranked[: payload.limit]
     ]
 
-    return SemanticSearchResponse(query=query, results=results)
+
+@router.post("/semantic", response_model=SemanticSearchResponse)
+async def semantic_search(
+    payload: SemanticSearchRequest, db: AsyncSession = Depends(get_db)
+):
+    query = payload.query.strip()
+    query_terms = set(extract_keywords(query, limit=12))
+    if not query_terms and query:
+        query_terms = {part.lower() for part in query.split() if part.strip()}
+
+    engine = payload.engine or DEFAULT_SEARCH_ENGINE
+    if engine == SearchEngine.fulltext:
+        weights = payload.weights or FullTextWeights()
+        results = await _fulltext_search(db, payload, query_terms, weights)
+        return SemanticSearchResponse(
+            query=query, engine=engine, weights=weights, results=results
+        )
+
+    if engine == SearchEngine.vector:
+        results = await _vector_search(db, payload, query, query_terms)
+        return SemanticSearchResponse(query=query, engine=engine, results=results)
+
+    results = await _index_search(db, payload, query, query_terms)
+    return SemanticSearchResponse(query=query, engine=engine, results=results)
@@ -7,7 +7,8 @@ from __future__ import annotations
 import re
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from pydantic import TypeAdapter
 from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -20,9 +21,14 @@ from ..models import (
     StackPublishRequest,
     StackUpdate,
 )
+from ..services.etags import row_validators
+from ..services.read_cache import cached_collection, read_cache
+from ..services.snapshots import refresh_public_stack
 
 router = APIRouter(prefix="/stacks", tags=["stacks"])
 
+STACK_LIST = TypeAdapter(list[Stack])
+
 
 def slugify(value: str) -> str:
     slug = re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")
@@ -40,14 +46,27 @@ async def _ensure_unique_slug(
 
 
 @router.get("", response_model=list[Stack])
-async def get_all_stacks(db: AsyncSession = Depends(get_db)):
-    query = select(StackModel).order_by(StackModel.created_at.asc())
-    result = await db.execute(query)
-    return result.scalars().all()
+async def get_all_stacks(request: Request, db: AsyncSession = Depends(get_db)):
+    async def load() -> bytes:
+        query = select(StackModel).order_by(StackModel.created_at.asc())
+        result = await db.execute(query)
+        return STACK_LIST.dump_json(
+            STACK_LIST.validate_python(result.scalars().all(), from_attributes=True)
+        )
+
+    return await cached_collection(request, db, "stacks", "stacks", load)
 
 
 @router.get("/{stack_id}", response_model=Stack)
-async def get_stack(stack_id: str, db: AsyncSession = Depends(get_db)):
+async def get_stack(
+    stack_id: str, request: Request, response: Response, db: AsyncSession = Depends(get_db)
+):
+    validators = await row_validators(db, StackModel, stack_id)
+    if validators is not None:
+        if validators.matches(request):
+            return validators.not_modified()
+        validators.apply(response)
+
     result = await db.execute(select(StackModel).where(StackModel.id == stack_id))
     stack = result.scalar_one_or_none()
     if not stack:
@@ -72,6 +91,7 @@ async def create_stack(stack: StackCreate, db: AsyncSession = Depends(get_db)):
     )
     db.add(new_stack)
     await db.commit()
+    read_cache.invalidate("stacks")
     await db.refresh(new_stack)
     return new_stack
 
@@ -100,10 +120,13 @@ async def update_stack(
             await _ensure_unique_slug(db, candidate_slug, stack_id)
             update_data["slug"] = candidate_slug
 
+    previous_slug = stack.slug
     for key, value in update_data.items():
         setattr(stack, key, value)
 
     await db.commit()
+    read_cache.invalidate("stacks")
+    await refresh_public_stack(db, stack_id, previous_slug)
     await db.refresh(stack)
     return stack
 
@@ -118,6 +141,7 @@ async def publish_stack(
     if not stack:
         raise HTTPException(status_code=404, detail="Stack not found")
 
+    previous_slug = stack.slug
     stack.is_published = payload.is_published
     if payload.is_published:
         stack.slug = slugify(payload.slug or stack.slug or stack.name)
@@ -127,6 +151,8 @@ async def publish_stack(
         stack.published_at = None
 
     await db.commit()
+    read_cache.invalidate("stacks")
+    await refresh_public_stack(db, stack_id, previous_slug)
     await db.refresh(stack)
     return stack
 
@@ -139,6 +165,11 @@ async def delete_stack(stack_id: str, db: AsyncSession = Depends(get_db)):
         .values(stack_id=None, stack_order=None)
     )
 
-    await db.execute(delete(StackModel).where(StackModel.id == stack_id))
+    result = await db.execute(
+        delete(StackModel).where(StackModel.id == stack_id).returning(StackModel.slug)
+    )
+    previous_slug = result.scalar_one_or_none()
     await db.commit()
+    read_cache.invalidate("stacks", "blocks")
+    await refresh_public_stack(db, stack_id, previous_slug)
     return None
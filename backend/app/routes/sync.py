@@ -0,0 +1,141 @@
+"""
+Delta sync routes.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import AsyncSessionLocal, get_db
+from ..models import (
+    PromptBlockModel,
+    StackModel,
+    SyncResponse,
+    SyncTombstone,
+    SyncTombstoneModel,
+    TagColorModel,
+)
+from ..services.change_feed import (
+    RESYNC,
+    ChangeEvent,
+    catch_up,
+    change_feed,
+    changed_after,
+    resync_required,
+    sync_watermark,
+    tombstone_horizon,
+)
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+SYNC_ENTITIES = ("blocks", "stacks", "tag_colors")
+
+
+async def _changed(db: AsyncSession, model, since: int, watermark: int, *conditions):
+    result = await db.execute(
+        select(model)
+        .where(
+            changed_after(model.change_seq, since), model.change_seq <= watermark, *conditions
+        )
+        .order_by(model.change_seq)
+    )
+    return result.scalars().all()
+
+
+@router.get("", response_model=SyncResponse)
+async def sync_changes(
+    since: int = Query(0, ge=0, description="Watermark returned by the previous sync"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Rows written and deleted after ``since``; pass the returned watermark next time.
+
+    The watermark stops below the oldest transaction still running, so a slow writer's
+    rows are picked up by a later sync instead of being skipped. Deletes are only kept
+    for the retention window; from further back ``resync_required`` is set instead."""
+    watermark = await sync_watermark(db, since)
+    if watermark == since:
+        return SyncResponse(watermark=watermark)
+
+    tombstones = await _changed(
+        db, SyncTombstoneModel, since, watermark, SyncTombstoneModel.entity.in_(SYNC_ENTITIES)
+    )
+    # Read after the tombstones: a prune that removed any of them is visible here.
+    if resync_required(since, await tombstone_horizon(db)):
+        return SyncResponse(watermark=watermark, resync_required=True)
+    return SyncResponse(
+        watermark=watermark,
+        blocks=await _changed(db, PromptBlockModel, since, watermark),
+        stacks=await _changed(db, StackModel, since, watermark),
+        tag_colors=await _changed(db, TagColorModel, since, watermark),
+        tombstones=[
+            SyncTombstone(entity=item.entity, id=item.entity_id, deleted_at=item.deleted_at)
+            for item in tombstones
+        ],
+    )
+
+
+def _format_batch(watermark: int, events: list[ChangeEvent]) -> str:
+    if not events:
+        # An id with no data updates the client's Last-Event-ID without firing an event.
+        return f": heartbeat\nid: {watermark}\n\n"
+    return "".join(
+        f"id: {watermark}\nevent: change\ndata: {json.dumps(event.as_dict())}\n\n"
+        for event in events
+    )
+
+
+async def _event_stream(since: Optional[int]) -> AsyncIterator[str]:
+    subscription = change_feed.subscribe()
+    try:
+        # Subscribed before catching up, so nothing falls between the two; an event may
+        # arrive twice, which clients treat as idempotent.
+        position, events = await catch_up(since)
+        # Read before the first yield: once streaming, a client that disconnects cancels
+        # the generator, and cancelling a session mid-query poisons its pooled connection.
+        horizon = 0
+        if since:
+            async with AsyncSessionLocal() as db:
+                horizon = await tombstone_horizon(db)
+        yield "retry: 3000\n" + _format_batch(position, events)
+        if resync_required(since, horizon):
+            # Deletes from before ``since`` may be gone; the client has to reload.
+            yield f"id: {position}\nevent: resync\ndata: {{}}\n\n"
+        while True:
+            batch = await subscription.queue.get()
+            if batch is RESYNC:
+                watermark, events = await catch_up(position)
+            else:
+                watermark, events = batch
+            position = max(position, watermark)
+            yield _format_batch(position, events)
+    finally:
+        change_feed.unsubscribe(subscription)
+
+
+@router.get("/stream")
+async def stream_changes(
+    request: Request,
+    since: Optional[int] = Query(
+        None, ge=0, description="Watermark to start after, e.g. from /bootstrap or /sync"
+    ),
+):
+    """Server-sent change events for blocks, stacks, tag colors and compositions.
+
+    Every event id is a sync watermark. Reconnecting with it (browsers send it as
+    Last-Event-ID, which wins over ``since``) replays whatever changed in between
+    before going live again. A ``resync`` event means ``since`` is older than the
+    tombstone retention window and the client should reload."""
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    return StreamingResponse(
+        _event_stream(since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
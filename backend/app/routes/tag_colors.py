@@ -2,23 +2,33 @@
 API routes for tag colors
 """
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, status
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 from sqlalchemy.dialects.postgresql import insert
 from ..database import get_db
 from ..models import TagColor, TagColorCreate, TagColorModel
+from ..services.read_cache import cached_collection, read_cache
 
 router = APIRouter(prefix="/tag-colors", tags=["tag-colors"])
 
+TAG_COLOR_LIST = TypeAdapter(list[TagColor])
+
 
 @router.get("", response_model=list[TagColor])
-async def get_all_tag_colors(db: AsyncSession = Depends(get_db)):
+async def get_all_tag_colors(request: Request, db: AsyncSession = Depends(get_db)):
     """Get all tag colors."""
-    query = select(TagColorModel)
-    result = await db.execute(query)
-    colors = result.scalars().all()
-    return colors
+
+    async def load() -> bytes:
+        query = select(TagColorModel)
+        result = await db.execute(query)
+        colors = result.scalars().all()
+        return TAG_COLOR_LIST.dump_json(
+            TAG_COLOR_LIST.validate_python(colors, from_attributes=True)
+        )
+
+    return await cached_collection(request, db, "tag_colors", "tag_colors", load)
 
 
 @router.put("/{tag_name}", response_model=TagColor)
@@ -37,6 +47,7 @@ async def set_tag_color(
     
     await db.execute(stmt)
     await db.commit()
+    read_cache.invalidate("tag_colors")
 
     return TagColor(name=tag_name, hue=color.hue, lightness=color.lightness)
 
@@ -46,4 +57,5 @@ async def delete_tag_color(tag_name: str, db: AsyncSession = Depends(get_db)):
     """Delete a custom tag color."""
     await db.execute(delete(TagColorModel).where(TagColorModel.name == tag_name))
     await db.commit()
+    read_cache.invalidate("tag_colors")
     return None
@@ -0,0 +1,96 @@
+"""
+API routes for tag facets and the tag vocabulary.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy import distinct, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_db
+from ..models import (
+    PromptBlockModel,
+    TagColorModel,
+    TagFacet,
+    TagVocabularyEntry,
+    TagVocabularyModel,
+)
+from ..services.etags import table_validators
+
+router = APIRouter(prefix="/tags", tags=["tags"])
+
+
+@router.get("", response_model=list[TagFacet])
+async def get_tag_facets(
+    request: Request,
+    response: Response,
+    stack_id: Optional[str] = Query(None, description="Only count blocks in this stack"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Tag -> number of blocks carrying it, most used first."""
+    validators = await table_validators(db, "prompt_blocks")
+    if validators.matches(request):
+        return validators.not_modified()
+    validators.apply(response)
+
+    if not stack_id:
+        # The vocabulary already holds the library-wide counts.
+        result = await db.execute(
+            select(TagVocabularyModel.name, TagVocabularyModel.usage_count).order_by(
+                TagVocabularyModel.usage_count.desc(), TagVocabularyModel.name
+            )
+        )
+        return [TagFacet(name=name, count=total) for name, total in result.all()]
+
+    tag = func.jsonb_array_elements_text(PromptBlockModel.tags).table_valued("value").alias("tag")
+    count = func.count(distinct(PromptBlockModel.id))
+    query = (
+        select(tag.c.value, count)
+        .select_from(PromptBlockModel, tag)
+        .where(
+            PromptBlockModel.stack_id == stack_id,
+            func.jsonb_typeof(PromptBlockModel.tags) == "array",
+        )
+        .group_by(tag.c.value)
+        .order_by(count.desc(), tag.c.value)
+    )
+    result = await db.execute(query)
+    return [TagFacet(name=name, count=total) for name, total in result.all()]
+
+
+@router.get("/vocabulary", response_model=list[TagVocabularyEntry])
+async def get_tag_vocabulary(
+    request: Request,
+    response: Response,
+    q: Optional[str] = Query(None, description="Case-insensitive spelling to look up"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Every tag in use with its usage count and custom color, if any.
+
+    With ``q`` only the spellings equal to it ignoring case are returned, so "UX" finds
+    "ux" as well."""
+    validators = await table_validators(db, "prompt_blocks", "tag_colors")
+    if validators.matches(request):
+        return validators.not_modified()
+    validators.apply(response)
+
+    query = (
+        select(
+            TagVocabularyModel.name,
+            TagVocabularyModel.usage_count,
+            TagColorModel.hue,
+            TagColorModel.lightness,
+        )
+        .outerjoin(TagColorModel, TagColorModel.name == TagVocabularyModel.name)
+        .order_by(TagVocabularyModel.name)
+    )
+    if q:
+        query = query.where(func.lower(TagVocabularyModel.name) == func.lower(q.strip()))
+    result = await db.execute(query)
+    return [
+        TagVocabularyEntry(name=name, usage_count=usage_count, hue=hue, lightness=lightness)
+        for name, usage_count, hue, lightness in result.all()
+    ]
@@ -0,0 +1,314 @@
+"""
+Change feed: one LISTEN connection per process, fanned out to in-memory subscribers.
+
+Rows written to tracked tables emit a NOTIFY on ``CHANGE_CHANNEL`` (see database.py).
+Each batch of notifications is stamped with a sync watermark read on the listening
+connection itself: Postgres sends every notification of transactions that committed
+before that snapshot ahead of the query's result, so once a subscriber has seen a batch
+nothing at or below its watermark is still on its way. Resuming from that watermark
+through the sync delta therefore loses no events.
+
+After the listening connection is lost, the feed catches up once from the last
+watermark it broadcast and fans that result out, so a database restart does not make
+every subscriber query on its own.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Callable
+
+import asyncpg
+from sqlalchemy import BigInteger, Text, cast, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import CHANGE_CHANNEL, AsyncSessionLocal, engine
+from ..models import (
+    CompositionModel,
+    PromptBlockModel,
+    StackModel,
+    SyncHorizonModel,
+    SyncTombstoneModel,
+    TagColorModel,
+)
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "64"))
+CHANGE_FEED_HEARTBEAT_SECONDS = float(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", "25"))
+# Bounds how many database catch-ups (new streams, slow subscribers) run at once.
+CHANGE_FEED_CATCH_UP_CONCURRENCY = int(os.getenv("CHANGE_FEED_CATCH_UP_CONCURRENCY", "4"))
+RECONNECT_DELAY_SECONDS = 2.0
+# Deletes are reported for this long; a client resuming from further back must resync.
+SYNC_TOMBSTONE_RETENTION = timedelta(
+    hours=float(os.getenv("SYNC_TOMBSTONE_RETENTION_HOURS", "720"))
+)
+SYNC_TOMBSTONE_PRUNE_SECONDS = float(os.getenv("SYNC_TOMBSTONE_PRUNE_SECONDS", "3600"))
+
+WATERMARK_SQL = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint - 1"
+
+# Queued in place of a batch when a subscriber may have missed events; it should catch
+# up from its last watermark through the sync delta.
+RESYNC = None
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    entity: str
+    op: str
+    id: str
+    seq: int
+    # Stacks a block left or joined; None when unknown, as for catch-up events.
+    stack_ids: list[str] | None = field(default=None, compare=False)
+
+    def as_dict(self) -> dict:
+        return {"entity": self.entity, "op": self.op, "id": self.id, "seq": self.seq}
+
+
+# (watermark, events) or RESYNC
+ChangeBatch = tuple[int, list[ChangeEvent]] | None
+
+# Entity name and key column for each table the change feed reports.
+FEED_SOURCES = (
+    ("blocks", PromptBlockModel.id),
+    ("stacks", StackModel.id),
+    ("tag_colors", TagColorModel.name),
+    ("compositions", CompositionModel.id),
+)
+
+async def sync_watermark(db: AsyncSession, since: int = 0) -> int:
+    """Highest change_seq below every transaction still running when this is called."""
+    xmin = await db.scalar(
+        select(cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger))
+    )
+    return max(since, xmin - 1)
+
+
+def changed_after(column, since: int):
+    """``column > since``, except that since=0 asks for everything: rows written before
+    change tracking existed were backfilled with change_seq 0 and must be included."""
+    return column > since if since else column >= 0
+
+
+async def tombstone_horizon(db: AsyncSession) -> int:
+    """Highest change_seq whose tombstone may already have been pruned."""
+    return await db.scalar(select(SyncHorizonModel.pruned_through)) or 0
+
+
+def resync_required(since: int | None, horizon: int) -> bool:
+    # since=0 (or none) asks for everything, which needs no tombstones.
+    return bool(since) and since < horizon
+
+
+async def prune_tombstones(db: AsyncSession) -> int:
+    """Drop tombstones older than the retention window and raise the horizon past them.
+    The caller owns the commit."""
+    result = await db.execute(
+        delete(SyncTombstoneModel)
+        .where(SyncTombstoneModel.deleted_at < func.now() - SYNC_TOMBSTONE_RETENTION)
+        .returning(SyncTombstoneModel.change_seq)
+    )
+    pruned = result.scalars().all()
+    if pruned:
+        await db.execute(
+            update(SyncHorizonModel)
+            .where(SyncHorizonModel.id == 1)
+            .values(pruned_through=func.greatest(SyncHorizonModel.pruned_through, max(pruned)))
+        )
+    return len(pruned)
+
+
+class TombstonePruner:
+    """Prunes tombstones every SYNC_TOMBSTONE_PRUNE_SECONDS, off the request path."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    if await prune_tombstones(db):
+                        await db.commit()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - try again next interval
+                logger.exception("Tombstone pruning failed")
+            await asyncio.sleep(self.interval)
+
+
+tombstone_pruner = TombstonePruner(SYNC_TOMBSTONE_PRUNE_SECONDS)
+
+
+_catch_up_slots = asyncio.Semaphore(CHANGE_FEED_CATCH_UP_CONCURRENCY)
+
+
+async def catch_up(since: int | None) -> tuple[int, list[ChangeEvent]]:
+    """The current watermark and the ids written or deleted after ``since``.
+
+    Events are not capped at the watermark: a transaction above it that committed
+    before this read may already have been announced to other listeners, so it is
+    reported here rather than lost. Clients treat repeats as harmless."""
+    async with _catch_up_slots, AsyncSessionLocal() as db:
+        watermark = await sync_watermark(db, since or 0)
+        if since is None:
+            return watermark, []
+
+        events = []
+        for entity, key in FEED_SOURCES:
+            model = key.class_
+            result = await db.execute(
+                select(key, model.change_seq).where(changed_after(model.change_seq, since))
+            )
+            events += [
+                ChangeEvent(entity, "upsert", row_id, seq) for row_id, seq in result.all()
+            ]
+        result = await db.execute(
+            select(
+                SyncTombstoneModel.entity,
+                SyncTombstoneModel.entity_id,
+                SyncTombstoneModel.change_seq,
+            ).where(changed_after(SyncTombstoneModel.change_seq, since))
+        )
+        events += [
+            ChangeEvent(entity, "delete", row_id, seq) for entity, row_id, seq in result.all()
+        ]
+    return watermark, sorted(events, key=lambda event: event.seq)
+
+
+class Subscription:
+    def __init__(self, size: int):
+        self.queue: asyncio.Queue[ChangeBatch] = asyncio.Queue(size)
+
+    def deliver(self, batch: ChangeBatch) -> None:
+        try:
+            self.queue.put_nowait(batch)
+        except asyncio.QueueFull:
+            # A slow reader loses its backlog and catches up from the database instead.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class ChangeFeed:
+    def __init__(self):
+        self._subscribers: set[Subscription] = set()
+        self._listeners: list[Callable[[ChangeBatch], None]] = []
+        self._pending: list[str] = []
+        self._arrived = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # Watermark of the last batch broadcast; every subscriber has seen up to here.
+        self._position: int | None = None
+        # True while LISTEN is active, i.e. while every committed write reaches us.
+        self.connected = False
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(CHANGE_FEED_QUEUE_SIZE)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def add_listener(self, listener: Callable[[ChangeBatch], None]) -> None:
+        """Call ``listener`` synchronously with every batch, including RESYNC."""
+        self._listeners.append(listener)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _broadcast(self, batch: ChangeBatch) -> None:
+        for listener in self._listeners:
+            listener(batch)
+        for subscription in list(self._subscribers):
+            subscription.deliver(batch)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        self._pending.append(payload)
+        self._arrived.set()
+
+    async def _run(self) -> None:
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                await connection.add_listener(CHANGE_CHANNEL, self._on_notify)
+                if self._position is None:
+                    # Streams opened before we listened may have missed events.
+                    self._broadcast(RESYNC)
+                else:
+                    # Notifications sent while we were disconnected are gone; replay them
+                    # once here instead of having every subscriber query for itself.
+                    self._publish(*await catch_up(self._position))
+                self.connected = True
+                await self._pump(connection)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - keep listening across DB restarts
+                logger.exception("Change feed connection lost")
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    def _publish(self, watermark: int, events: list[ChangeEvent]) -> None:
+        self._position = max(self._position or 0, watermark)
+        self._broadcast((watermark, events))
+
+    async def _pump(self, connection: asyncpg.Connection) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._arrived.wait(), CHANGE_FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._arrived.clear()
+            # Also serves as the heartbeat that advances idle subscribers' watermarks.
+            watermark = await connection.fetchval(WATERMARK_SQL)
+            payloads, self._pending = self._pending, []
+            events = []
+            for payload in payloads:
+                try:
+                    events.append(ChangeEvent(**json.loads(payload)))
+                except (TypeError, ValueError):
+                    logger.warning("Ignoring malformed change event: %s", payload)
+            self._publish(watermark, events)
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,152 @@
+"""
+Content-addressed cache of model-derived insights, shared by prompts with identical text.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Iterable
+
+from sqlalchemy import delete, func, null, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import InsightContentCacheModel, PromptInsightModel
+
+INSIGHT_CACHE_TTL_HOURS = int(os.getenv("INSIGHT_CACHE_TTL_HOURS", "720"))
+INSIGHT_CACHE_MAX_ENTRIES = int(os.getenv("INSIGHT_CACHE_MAX_ENTRIES", "20000"))
+# Recency is tracked coarsely so hot entries are not rewritten on every read.
+TOUCH_INTERVAL = timedelta(minutes=5)
+PRUNE_EVERY = 200
+
+_stores_since_prune = 0
+
+
+@dataclass
+class CachedContent:
+    scorecard: dict[str, Any] | None
+    semantic_profile: dict[str, Any] | None
+
+
+def _expiry_cutoff():
+    return func.now() - timedelta(hours=INSIGHT_CACHE_TTL_HOURS)
+
+
+async def lookup_content(
+    db: AsyncSession, hashes: Iterable[str]
+) -> dict[str, CachedContent]:
+    """Return unexpired cache entries for ``hashes`` and mark them recently used."""
+    hashes = {value for value in hashes if value}
+    if not hashes:
+        return {}
+
+    result = await db.execute(
+        select(
+            InsightContentCacheModel.content_hash,
+            InsightContentCacheModel.scorecard,
+            InsightContentCacheModel.semantic_profile,
+        ).where(
+            InsightContentCacheModel.content_hash.in_(hashes),
+            InsightContentCacheModel.last_used_at >= _expiry_cutoff(),
+        )
+    )
+    entries = {
+        value: CachedContent(scorecard=scorecard, semantic_profile=semantic_profile)
+        for value, scorecard, semantic_profile in result.all()
+    }
+
+    if entries:
+        await db.execute(
+            update(InsightContentCacheModel)
+            .where(
+                InsightContentCacheModel.content_hash.in_(entries),
+                InsightContentCacheModel.last_used_at < func.now() - TOUCH_INTERVAL,
+            )
+            .values(last_used_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+    return entries
+
+
+async def store_content(
+    db: AsyncSession,
+    current_hash: str,
+    *,
+    scorecard: dict[str, Any] | None = None,
+    semantic_profile: dict[str, Any] | None = None,
+) -> None:
+    """Merge freshly computed results into the cache. The caller owns the commit."""
+    global _stores_since_prune
+    if scorecard is None and semantic_profile is None:
+        return
+
+    statement = insert(InsightContentCacheModel).values(
+        content_hash=current_hash,
+        scorecard=scorecard if scorecard is not None else null(),
+        semantic_profile=semantic_profile if semantic_profile is not None else null(),
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["content_hash"],
+        set_={
+            "scorecard": func.coalesce(
+                statement.excluded.scorecard, InsightContentCacheModel.scorecard
+            ),
+            "semantic_profile": func.coalesce(
+                statement.excluded.semantic_profile, InsightContentCacheModel.semantic_profile
+            ),
+            "last_used_at": func.now(),
+        },
+    )
+    await db.execute(statement)
+
+    _stores_since_prune += 1
+    if _stores_since_prune >= PRUNE_EVERY:
+        _stores_since_prune = 0
+        await prune_content_cache(db)
+
+
+async def prune_content_cache(db: AsyncSession) -> None:
+    """Drop expired entries, then the least recently used ones beyond the size cap."""
+    await db.execute(
+        delete(InsightContentCacheModel).where(
+            InsightContentCacheModel.last_used_at < _expiry_cutoff()
+        )
+    )
+    oldest_kept = (
+        select(InsightContentCacheModel.last_used_at)
+        .order_by(InsightContentCacheModel.last_used_at.desc())
+        .offset(INSIGHT_CACHE_MAX_ENTRIES)
+        .limit(1)
+        .scalar_subquery()
+    )
+    await db.execute(
+        delete(InsightContentCacheModel).where(
+            InsightContentCacheModel.last_used_at <= oldest_kept
+        )
+    )
+
+
+async def backfill_content_cache(db: AsyncSession) -> None:
+    """Seed the cache from insights computed before it existed, then prune it."""
+    latest = (
+        select(
+            PromptInsightModel.content_hash,
+            PromptInsightModel.scorecard,
+            PromptInsightModel.semantic_profile,
+        )
+        .where(
+            PromptInsightModel.scorecard.is_not(None)
+            | PromptInsightModel.semantic_profile.is_not(None)
+        )
+        .distinct(PromptInsightModel.content_hash)
+        .order_by(PromptInsightModel.content_hash, PromptInsightModel.updated_at.desc())
+    )
+    await db.execute(
+        insert(InsightContentCacheModel)
+        .from_select(["content_hash", "scorecard", "semantic_profile"], latest)
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+    )
+    await prune_content_cache(db)
+    await db.commit()
@@ -0,0 +1,297 @@
+"""
+Local hashed embeddings and an in-process IVF index for nearest-neighbour lookups.
+
+Every process holds its own copy of the index. Writes in this process apply their
+vectors after commit (see search_index.py); writes in other workers, replicas or the
+job worker arrive as block events through ``change_feed`` and are reloaded from the
+database. Insight-only changes that leave the block row untouched are picked up by a
+periodic full reload.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import zlib
+from typing import Any, Iterable
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import AsyncSessionLocal
+from ..models import PromptBlockModel, PromptInsightModel
+from .change_feed import RESYNC, ChangeBatch, change_feed
+from .openrouter import content_hash, heuristic_semantic_profile
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+EMBEDDING_NPROBE = int(os.getenv("EMBEDDING_NPROBE", "6"))
+VECTOR_INDEX_RELOAD_SECONDS = float(os.getenv("VECTOR_INDEX_RELOAD_SECONDS", "300"))
+TERM_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.3
+
+# Below this size an exact scan is cheaper than maintaining clusters.
+EXACT_SCAN_LIMIT = 1024
+
+
+def _profile_features(profile: dict[str, Any]) -> Iterable[tuple[str, float]]:
+    words = []
+    for key in ("keywords", "constraints", "personas"):
+        for item in profile.get(key, []):
+            if isinstance(item, str):
+                words.extend(item.lower().split())
+    for key in ("intent", "output_style"):
+        if profile.get(key):
+            words.extend(str(profile[key]).lower().split())
+
+    for word in set(words):
+        yield f"w:{word}", TERM_WEIGHT
+        padded = f"^{word}$"
+        for index in range(len(padded) - 2):
+            yield f"g:{padded[index : index + 3]}", TRIGRAM_WEIGHT
+
+
+def embed_profile(profile: dict[str, Any] | None) -> np.ndarray:
+    """Hash profile terms and their character trigrams into a unit float32 vector."""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for feature, weight in _profile_features(profile or {}):
+        bucket = zlib.crc32(feature.encode("utf-8"))
+        sign = 1.0 if bucket & 0x80000000 else -1.0
+        vector[bucket % EMBEDDING_DIM] += sign * weight
+
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def encode_embedding(vector: np.ndarray) -> bytes:
+    return vector.astype(np.float32).tobytes()
+
+
+def decode_embedding(data: bytes | None) -> np.ndarray | None:
+    if not data:
+        return None
+    vector = np.frombuffer(data, dtype=np.float32)
+    if vector.shape[0] != EMBEDDING_DIM:
+        return None
+    return vector
+
+
+class VectorIndex:
+    """Inverted-file index: vectors are bucketed under their nearest centroid and
+    a query only scans the ``nprobe`` closest buckets."""
+
+    def __init__(self, dim: int, nprobe: int = EMBEDDING_NPROBE):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.vectors: dict[str, np.ndarray] = {}
+        self.centroids: np.ndarray | None = None
+        self.lists: list[set[str]] = []
+        self.assignment: dict[str, int] = {}
+        self.trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def clear(self) -> None:
+        self.vectors.clear()
+        self._reset_clusters()
+
+    def _reset_clusters(self) -> None:
+        self.centroids = None
+        self.lists = []
+        self.assignment = {}
+        self.trained_size = 0
+
+    def upsert(self, item_id: str, vector: np.ndarray) -> None:
+        self.remove(item_id)
+        self.vectors[item_id] = vector
+        if self.centroids is None:
+            if len(self.vectors) > EXACT_SCAN_LIMIT:
+                self.train()
+            return
+        if len(self.vectors) > 4 * self.trained_size:
+            self.train()
+            return
+        self._assign(item_id, vector)
+
+    def remove(self, item_id: str) -> None:
+        if self.vectors.pop(item_id, None) is None:
+            return
+        cluster = self.assignment.pop(item_id, None)
+        if cluster is not None:
+            self.lists[cluster].discard(item_id)
+
+    def _assign(self, item_id: str, vector: np.ndarray) -> None:
+        cluster = int(np.argmax(self.centroids @ vector))
+        self.lists[cluster].add(item_id)
+        self.assignment[item_id] = cluster
+
+    def train(self, iterations: int = 8, seed: int = 7) -> None:
+        """Rebuild clusters with spherical k-means over the current vectors."""
+        if len(self.vectors) <= EXACT_SCAN_LIMIT:
+            self._reset_clusters()
+            return
+
+        ids = list(self.vectors)
+        matrix = np.stack([self.vectors[item_id] for item_id in ids])
+        n_lists = max(1, int(np.sqrt(len(ids))))
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(len(ids), size=n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = np.argmax(matrix @ centroids.T, axis=1)
+            for cluster in range(n_lists):
+                members = matrix[labels == cluster]
+                if len(members) == 0:
+                    continue
+                centroid = members.sum(axis=0)
+                norm = float(np.linalg.norm(centroid))
+                if norm > 0:
+                    centroids[cluster] = centroid / norm
+
+        labels = np.argmax(matrix @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.lists = [set() for _ in range(n_lists)]
+        self.assignment = {}
+        for item_id, label in zip(ids, labels):
+            self.lists[int(label)].add(item_id)
+            self.assignment[item_id] = int(label)
+        self.trained_size = len(ids)
+
+    def search(
+        self, vector: np.ndarray, k: int, exclude: set[str] | None = None
+    ) -> list[tuple[str, float]]:
+        exclude = exclude or set()
+        if self.centroids is None:
+            candidates = list(self.vectors)
+        else:
+            probes = np.argsort(-(self.centroids @ vector))[: self.nprobe]
+            candidates = [item_id for probe in probes for item_id in self.lists[int(probe)]]
+
+        candidates = [item_id for item_id in candidates if item_id not in exclude]
+        if not candidates or k <= 0:
+            return []
+
+        matrix = np.stack([self.vectors[item_id] for item_id in candidates])
+        scores = matrix @ vector
+        top = np.argsort(-scores)[:k]
+        return [(candidates[index], float(scores[index])) for index in top]
+
+
+vector_index = VectorIndex(EMBEDDING_DIM)
+
+
+async def _stored_vectors(
+    db: AsyncSession, prompt_ids: Iterable[str] | None = None
+) -> dict[str, np.ndarray]:
+    """Vectors for the given prompts (all when ``None``) from stored embeddings, embedding the rest locally."""
+    query = select(
+        PromptBlockModel.id,
+        PromptBlockModel.title,
+        PromptBlockModel.content,
+        PromptBlockModel.tags,
+        PromptInsightModel.content_hash,
+        PromptInsightModel.semantic_profile,
+        PromptInsightModel.embedding,
+    ).outerjoin(PromptInsightModel, PromptInsightModel.prompt_id == PromptBlockModel.id)
+    if prompt_ids is not None:
+        query = query.where(PromptBlockModel.id.in_(list(prompt_ids)))
+    result = await db.execute(query)
+
+    vectors = {}
+    for prompt_id, title, content, tags, stored_hash, profile, stored_embedding in result.all():
+        vector = None
+        if stored_hash == content_hash(content):
+            vector = decode_embedding(stored_embedding)
+            if vector is None and profile:
+                vector = embed_profile(profile)
+        if vector is None:
+            vector = embed_profile(heuristic_semantic_profile(title, content, list(tags or [])))
+        vectors[prompt_id] = vector
+    return vectors
+
+
+async def load_vector_index(db: AsyncSession) -> int:
+    """Populate the process-wide index from the database."""
+    vectors = await _stored_vectors(db)
+    vector_index.clear()
+    vector_index.vectors.update(vectors)
+    vector_index.train()
+    return len(vector_index)
+
+
+async def refresh_vectors(db: AsyncSession, prompt_ids: set[str]) -> None:
+    """Reload the vectors of ``prompt_ids``, dropping prompts that no longer exist."""
+    vectors = await _stored_vectors(db, prompt_ids)
+    for prompt_id in prompt_ids:
+        if prompt_id in vectors:
+            vector_index.upsert(prompt_id, vectors[prompt_id])
+        else:
+            vector_index.remove(prompt_id)
+
+
+class VectorIndexSync:
+    """Applies block changes from the change feed to this process's index."""
+
+    def __init__(self, reload_seconds: float):
+        self.reload_seconds = reload_seconds
+        self._dirty: set[str] = set()
+        self._reload = False
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def on_changes(self, batch: ChangeBatch) -> None:
+        if batch is RESYNC:
+            # Events may have been missed while nobody was listening.
+            self._reload = True
+        else:
+            _, events = batch
+            self._dirty.update(event.id for event in events if event.entity == "blocks")
+        if self._reload or self._dirty:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.reload_seconds)
+            except asyncio.TimeoutError:
+                self._reload = True
+            self._wakeup.clear()
+
+            reload, self._reload = self._reload, False
+            dirty, self._dirty = self._dirty, set()
+            try:
+                async with AsyncSessionLocal() as db:
+                    if reload:
+                        await load_vector_index(db)
+                    else:
+                        await refresh_vectors(db, dirty)
+            except Exception:  # noqa: BLE001 - keep syncing across DB hiccups
+                logger.exception("Vector index refresh failed")
+                self._reload = self._reload or reload
+                self._dirty |= dirty
+                await asyncio.sleep(1)
+                self._wakeup.set()
+
+
+vector_index_sync = VectorIndexSync(VECTOR_INDEX_RELOAD_SECONDS)
+change_feed.add_listener(vector_index_sync.on_changes)
@@ -0,0 +1,123 @@
+"""
+ETag / Last-Modified validators for conditional GETs.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import (
+    ChangeCounterModel,
+    CompositionItemModel,
+    CompositionModel,
+    PromptBlockModel,
+)
+
+
+@dataclass
+class Validators:
+    etag: str
+    last_modified: datetime | None = None
+    cache_control: str = "no-cache"
+
+    def matches(self, request: Request) -> bool:
+        """True when the client's copy is current; If-None-Match wins over If-Modified-Since."""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in candidates or self.etag in candidates
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.last_modified is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return self.last_modified.replace(microsecond=0) <= since
+        return False
+
+    def headers(self) -> dict[str, str]:
+        headers = {"ETag": self.etag, "Cache-Control": self.cache_control}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def apply(self, response: Response) -> None:
+        response.headers.update(self.headers())
+
+    def not_modified(self) -> Response:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=self.headers())
+
+
+def _etag(*parts: object) -> str:
+    digest = hashlib.md5("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+async def table_validators(db: AsyncSession, *tables: str) -> Validators:
+    """Validators for a collection built from ``tables``, read from their change counters."""
+    result = await db.execute(
+        select(
+            ChangeCounterModel.table_name,
+            ChangeCounterModel.version,
+            ChangeCounterModel.changed_at,
+        )
+        .where(ChangeCounterModel.table_name.in_(tables))
+        .order_by(ChangeCounterModel.table_name)
+    )
+    rows = result.all()
+    # changed_at tells a recreated database apart from one whose counters happen to match.
+    return Validators(
+        etag=_etag(
+            *(f"{name}:{version}:{changed_at.timestamp()}" for name, version, changed_at in rows)
+        ),
+        last_modified=max((changed_at for _, _, changed_at in rows), default=None),
+    )
+
+
+async def row_validators(db: AsyncSession, model, key: str) -> Validators | None:
+    """Validators for a single row from its change_seq; None when the row does not exist."""
+    primary_key = model.__mapper__.primary_key[0]
+    result = await db.execute(select(model.change_seq).where(primary_key == key))
+    change_seq = result.scalar_one_or_none()
+    if change_seq is None:
+        return None
+    return Validators(etag=_etag(model.__tablename__, key, change_seq))
+
+
+async def composition_validators(db: AsyncSession, composition_id: str) -> Validators | None:
+    """Fingerprint a composition, its items and the prompts they embed in one aggregate query."""
+    item_state = func.concat_ws(
+        ":",
+        CompositionItemModel.id,
+        CompositionItemModel.change_seq,
+        PromptBlockModel.change_seq,
+    )
+    result = await db.execute(
+        select(
+            CompositionModel.change_seq,
+            func.md5(
+                func.string_agg(
+                    item_state,
+                    aggregate_order_by(literal_column("','"), CompositionItemModel.id),
+                )
+            ),
+        )
+        .outerjoin(CompositionItemModel, CompositionItemModel.composition_id == CompositionModel.id)
+        .outerjoin(PromptBlockModel, PromptBlockModel.id == CompositionItemModel.source_prompt_id)
+        .where(CompositionModel.id == composition_id)
+        .group_by(CompositionModel.id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None
+    change_seq, items_digest = row
+    return Validators(etag=_etag("compositions", composition_id, change_seq, items_digest))
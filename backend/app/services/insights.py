@@ -1,65 +1,38 @@
 """
-Prompt insight persistence and semantic scoring helpers.
+Prompt insight computation and persistence.
 """
 
 from __future__ import annotations
 
+import asyncio
+import os
+from dataclasses import dataclass, field
 from typing import Any
 
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..models import PromptBlockModel, PromptInsightModel
+from ..models import InsightKind, PromptBlockModel, PromptInsightModel, TagVocabularyModel
+from .content_cache import CachedContent, lookup_content, store_content
+from .embeddings import embed_profile, encode_embedding
 from .openrouter import (
     analyze_quality,
     build_semantic_profile,
     content_hash,
+    heuristic_scorecard,
     heuristic_semantic_profile,
     suggest_tags,
 )
+from .neighbors import current_neighbors, fallback_profile, update_neighbors
+from .search_index import index_prompt
+from .singleflight import SingleFlight
 
+INSIGHT_BATCH_CONCURRENCY = int(os.getenv("INSIGHT_BATCH_CONCURRENCY", "4"))
 
-def _profile_terms(profile: dict[str, Any] | None) -> set[str]:
-    if not profile:
-        return set()
-    terms = set()
-    for key in ("keywords", "constraints", "personas"):
-        for item in profile.get(key, []):
-            if isinstance(item, str):
-                terms.update(part.strip().lower() for part in item.split() if part.strip())
-    if profile.get("intent"):
-        terms.update(part.strip().lower() for part in str(profile["intent"]).split())
-    if profile.get("output_style"):
-        terms.update(part.strip().lower() for part in str(profile["output_style"]).split())
-    return terms
-
-
-def semantic_similarity(
-    source_profile: dict[str, Any], target_profile: dict[str, Any], query_terms: set[str] | None = None
-) -> tuple[float, str]:
-    source_terms = _profile_terms(source_profile)
-    target_terms = _profile_terms(target_profile)
-    if not source_terms or not target_terms:
-        return 0.0, "low-confidence match"
-
-    overlap = source_terms & target_terms
-    union = source_terms | target_terms
-    score = len(overlap) / max(1, len(union))
-
-    if query_terms:
-        query_overlap = query_terms & target_terms
-        score += min(0.45, len(query_overlap) * 0.08)
-        if query_overlap:
-            return score, "similar intent"
-
-    if source_profile.get("output_style") == target_profile.get("output_style"):
-        score += 0.1
-        if overlap:
-            return score, "same output style"
-
-    if overlap:
-        return score, "overlapping constraints"
-    return score, "semantic overlap"
+# Shared by every request in this process. Tag calls are keyed per prompt because they
+# depend on its current tags; the rest depend only on the content hash.
+insight_flight = SingleFlight()
 
 
 async def fetch_prompt_or_404(db: AsyncSession, prompt_id: str) -> PromptBlockModel:
@@ -79,29 +52,160 @@ async def get_insight_row(
     return result.scalar_one_or_none()
 
 
-async def ensure_insight(
-    db: AsyncSession,
-    prompt: PromptBlockModel,
+async def _skip() -> None:
+    return None
+
+
+def _check_no_pending_changes(db: AsyncSession) -> None:
+    """Insight calls commit the session before the model runs, to hand the pooled
+    connection back while waiting. That is only safe on a session holding no changes of
+    the caller's: they would be committed as a side effect. Flush and commit (or roll
+    back) your own writes before calling in."""
+    if db.new or db.dirty or db.deleted:
+        raise RuntimeError("Insight computation needs a session without pending changes")
+
+
+@dataclass
+class InsightResults:
+    tags: dict[str, Any] | None = None
+    scorecard: dict[str, Any] | None = None
+    semantic_profile: dict[str, Any] | None = None
+    # Fields filled by the local heuristics because the model gave no answer.
+    fallbacks: frozenset[str] = field(default_factory=frozenset)
+
+    def __bool__(self) -> bool:
+        return any(
+            value is not None for value in (self.tags, self.scorecard, self.semantic_profile)
+        )
+
+    def merged(self, other: InsightResults) -> InsightResults:
+        """Fill fields missing here from ``other``."""
+        return InsightResults(
+            tags=self.tags if self.tags is not None else other.tags,
+            scorecard=self.scorecard if self.scorecard is not None else other.scorecard,
+            semantic_profile=self.semantic_profile
+            if self.semantic_profile is not None
+            else other.semantic_profile,
+        )
+
+    def from_model(self) -> InsightResults:
+        """Only the model-produced fields. Fallbacks must not be cached by content hash,
+        or they would keep the model from ever being asked again for that content."""
+        return InsightResults(
+            tags=self.tags,
+            scorecard=None if "scorecard" in self.fallbacks else self.scorecard,
+            semantic_profile=None
+            if "semantic_profile" in self.fallbacks
+            else self.semantic_profile,
+        )
+
+
+def cached_results(
+    entry: CachedContent | None, *, quality: bool, semantic: bool
+) -> InsightResults:
+    """The parts of a content cache entry that cover the requested insights."""
+    if entry is None:
+        return InsightResults()
+    return InsightResults(
+        scorecard=entry.scorecard if quality else None,
+        semantic_profile=entry.semantic_profile if semantic else None,
+    )
+
+
+def insight_needs(
+    row: PromptInsightModel | None,
+    current_hash: str,
     *,
     update_tags: bool = False,
-    existing_tags: list[str] | None = None,
     update_quality: bool = False,
     update_semantic: bool = False,
-) -> tuple[PromptInsightModel, bool]:
-    row = await get_insight_row(db, prompt.id)
-    current_hash = content_hash(prompt.content)
+) -> tuple[bool, bool, bool]:
+    """Which of tags, quality and semantic profile are missing or stale for a row."""
     cached = row is not None and row.content_hash == current_hash
+    return (
+        update_tags and (not cached or not row.suggested_tags),
+        update_quality and (not cached or not row.scorecard),
+        update_semantic and (not cached or not row.semantic_profile),
+    )
 
+
+async def compute_insights(
+    prompt: PromptBlockModel,
+    *,
+    tags: bool = False,
+    quality: bool = False,
+    semantic: bool = False,
+    existing_tags: list[str] | None = None,
+) -> InsightResults:
+    """Run the requested model calls concurrently. Touches no database state.
+
+    Identical calls already in flight in this process are awaited instead of repeated."""
+    current_hash = content_hash(prompt.content)
+    title, body, current_tags = prompt.title, prompt.content, list(prompt.tags or [])
+
+    tag_result, scorecard, semantic_profile = await asyncio.gather(
+        insight_flight.do(
+            (prompt.id, current_hash, InsightKind.tags),
+            lambda: suggest_tags(title, body, existing_tags or [], current_tags),
+        )
+        if tags
+        else _skip(),
+        insight_flight.do(
+            (current_hash, InsightKind.quality),
+            lambda: analyze_quality(title, body, fallback=False),
+        )
+        if quality
+        else _skip(),
+        insight_flight.do(
+            (current_hash, "semantic"),
+            lambda: build_semantic_profile(title, body, current_tags, fallback=False),
+        )
+        if semantic
+        else _skip(),
+    )
+
+    fallbacks = set()
+    if quality and scorecard is None:
+        scorecard = heuristic_scorecard(body)
+        fallbacks.add("scorecard")
+    if semantic and semantic_profile is None:
+        semantic_profile = heuristic_semantic_profile(title, body, current_tags)
+        fallbacks.add("semantic_profile")
+    return InsightResults(
+        tags=tag_result,
+        scorecard=scorecard,
+        semantic_profile=semantic_profile,
+        fallbacks=frozenset(fallbacks),
+    )
+
+
+async def apply_insights(
+    db: AsyncSession,
+    prompt: PromptBlockModel,
+    row: PromptInsightModel | None,
+    results: InsightResults,
+) -> PromptInsightModel:
+    """Write computed results onto the prompt's insight row without committing."""
+    current_hash = content_hash(prompt.content)
     if row is None:
-        row = PromptInsightModel(
-            prompt_id=prompt.id,
-            content_hash=current_hash,
-            suggested_tags=[],
-            tag_merge_suggestions=[],
-            related_prompt_ids=[],
+        # Upsert so concurrent writers for the same prompt converge on one row.
+        await db.execute(
+            insert(PromptInsightModel)
+            .values(
+                prompt_id=prompt.id,
+                content_hash=current_hash,
+                suggested_tags=[],
+                tag_merge_suggestions=[],
+                related_prompt_ids=[],
+            )
+            .on_conflict_do_nothing(index_elements=["prompt_id"])
         )
-        db.add(row)
-        cached = False
+        result = await db.execute(
+            select(PromptInsightModel)
+            .where(PromptInsightModel.prompt_id == prompt.id)
+            .execution_options(populate_existing=True)
+        )
+        row = result.scalar_one()
 
     if row.content_hash != current_hash:
         row.content_hash = current_hash
@@ -109,34 +213,220 @@ async def ensure_insight(
         row.tag_merge_suggestions = []
         row.scorecard = None
         row.semantic_profile = None
+        row.embedding = None
         row.related_prompt_ids = []
-        cached = False
 
-    if update_tags and (not cached or not row.suggested_tags):
-        tag_result = suggest_tags(
-            prompt.title,
-            prompt.content,
-            existing_tags or [],
-            list(prompt.tags or []),
-        )
-        row.suggested_tags = tag_result.get("suggested_tags", [])
-        row.tag_merge_suggestions = tag_result.get("merge_suggestions", [])
-        cached = False
+    if results.tags is not None:
+        row.suggested_tags = results.tags.get("suggested_tags", [])
+        row.tag_merge_suggestions = results.tags.get("merge_suggestions", [])
 
-    if update_quality and (not cached or not row.scorecard):
-        row.scorecard = analyze_quality(prompt.title, prompt.content)
-        cached = False
+    if results.scorecard is not None:
+        row.scorecard = results.scorecard
+
+    if results.semantic_profile is not None:
+        row.semantic_profile = results.semantic_profile
+        row.embedding = encode_embedding(embed_profile(results.semantic_profile))
+        await index_prompt(db, prompt, results.semantic_profile)
+        await db.flush()
+        await update_neighbors(db, prompt, results.semantic_profile)
 
-    if update_semantic and (not cached or not row.semantic_profile):
-        row.semantic_profile = build_semantic_profile(
-            prompt.title, prompt.content, list(prompt.tags or [])
+    return row
+
+
+async def ensure_insight(
+    db: AsyncSession,
+    prompt: PromptBlockModel,
+    *,
+    update_tags: bool = False,
+    existing_tags: list[str] | None = None,
+    update_quality: bool = False,
+    update_semantic: bool = False,
+) -> tuple[PromptInsightModel, bool]:
+    """Compute missing or stale insights for a prompt and commit them.
+
+    The session must hold no changes of the caller's (see _check_no_pending_changes)."""
+    _check_no_pending_changes(db)
+    row = await get_insight_row(db, prompt.id)
+    current_hash = content_hash(prompt.content)
+    cached = row is not None and row.content_hash == current_hash
+
+    needs_tags, needs_quality, needs_semantic = insight_needs(
+        row,
+        current_hash,
+        update_tags=update_tags,
+        update_quality=update_quality,
+        update_semantic=update_semantic,
+    )
+
+    reused = InsightResults()
+    if needs_quality or needs_semantic:
+        entries = await lookup_content(db, [current_hash])
+        reused = cached_results(
+            entries.get(current_hash), quality=needs_quality, semantic=needs_semantic
+        )
+        needs_quality = needs_quality and reused.scorecard is None
+        needs_semantic = needs_semantic and reused.semantic_profile is None
+
+    computed = InsightResults()
+    if needs_tags or needs_quality or needs_semantic:
+        # Hand the pooled connection back while the model is working. This only
+        # commits our own reads and cache touches; the caller's changes were ruled out.
+        await db.commit()
+        computed = await compute_insights(
+            prompt,
+            tags=needs_tags,
+            quality=needs_quality,
+            semantic=needs_semantic,
+            existing_tags=existing_tags,
         )
+
+    results = computed.merged(reused)
+    if row is None or results:
         cached = False
+    row = await apply_insights(db, prompt, row, results)
+    produced = computed.from_model()
+    await store_content(
+        db,
+        current_hash,
+        scorecard=produced.scorecard,
+        semantic_profile=produced.semantic_profile,
+    )
 
     await db.commit()
     await db.refresh(row)
     return row, cached
 
 
-def fallback_profile(prompt: PromptBlockModel) -> dict[str, Any]:
-    return heuristic_semantic_profile(prompt.title, prompt.content, list(prompt.tags or []))
+async def index_new_prompt(db: AsyncSession, prompt: PromptBlockModel) -> None:
+    """Index a newly created prompt, seeding its insights from the content cache so
+    forks and duplicates start with a scorecard and profile. The caller owns the commit."""
+    current_hash = content_hash(prompt.content)
+    entry = (await lookup_content(db, [current_hash])).get(current_hash)
+    results = cached_results(entry, quality=True, semantic=True)
+    if results:
+        await apply_insights(db, prompt, None, results)
+    if results.semantic_profile is None:
+        await index_prompt(db, prompt)
+
+
+async def refresh_related(
+    db: AsyncSession, prompt: PromptBlockModel
+) -> tuple[PromptInsightModel, bool, dict[str, Any], list[tuple[float, str, PromptBlockModel]]]:
+    """Ensure a semantic profile exists, then rank and store the prompt's related ids."""
+    row, cached = await ensure_insight(db, prompt, update_semantic=True)
+    source_profile = row.semantic_profile or fallback_profile(prompt)
+
+    top = await current_neighbors(db, prompt, source_profile)
+    row.related_prompt_ids = [candidate.id for _, _, candidate in top]
+    await db.commit()
+    await db.refresh(row)
+    return row, cached, source_profile, top
+
+
+async def load_existing_tags(db: AsyncSession) -> list[str]:
+    result = await db.execute(select(TagVocabularyModel.name).order_by(TagVocabularyModel.name))
+    return list(result.scalars().all())
+
+
+async def batch_insights(
+    db: AsyncSession, prompts: list[PromptBlockModel], kinds: list[InsightKind]
+) -> list[tuple[PromptInsightModel, list[InsightKind]]]:
+    """Compute missing or stale insights for many prompts and write them in one transaction.
+
+    The session must hold no changes of the caller's (see _check_no_pending_changes)."""
+    _check_no_pending_changes(db)
+    result = await db.execute(
+        select(PromptInsightModel).where(
+            PromptInsightModel.prompt_id.in_([prompt.id for prompt in prompts])
+        )
+    )
+    rows: dict[str, PromptInsightModel | None] = {
+        row.prompt_id: row for row in result.scalars().all()
+    }
+    existing_tags = await load_existing_tags(db) if InsightKind.tags in kinds else []
+
+    hashes = {prompt.id: content_hash(prompt.content) for prompt in prompts}
+    plans = {
+        prompt.id: insight_needs(
+            rows.get(prompt.id),
+            hashes[prompt.id],
+            update_tags=InsightKind.tags in kinds,
+            update_quality=InsightKind.quality in kinds,
+            update_semantic=InsightKind.related in kinds,
+        )
+        for prompt in prompts
+    }
+
+    entries = await lookup_content(
+        db, {hashes[prompt_id] for prompt_id, needs in plans.items() if needs[1] or needs[2]}
+    )
+    reused = {}
+    for prompt in prompts:
+        needs_tags, needs_quality, needs_semantic = plans[prompt.id]
+        reused[prompt.id] = cached_results(
+            entries.get(hashes[prompt.id]), quality=needs_quality, semantic=needs_semantic
+        )
+
+    # Hand the pooled connection back while the model is working.
+    await db.commit()
+    semaphore = asyncio.Semaphore(INSIGHT_BATCH_CONCURRENCY)
+
+    async def run(prompt: PromptBlockModel) -> InsightResults:
+        needs_tags, needs_quality, needs_semantic = plans[prompt.id]
+        needs_quality = needs_quality and reused[prompt.id].scorecard is None
+        needs_semantic = needs_semantic and reused[prompt.id].semantic_profile is None
+        if not (needs_tags or needs_quality or needs_semantic):
+            return InsightResults()
+        async with semaphore:
+            return await compute_insights(
+                prompt,
+                tags=needs_tags,
+                quality=needs_quality,
+                semantic=needs_semantic,
+                existing_tags=existing_tags,
+            )
+
+    computed = await asyncio.gather(*(run(prompt) for prompt in prompts))
+
+    for prompt, results in zip(prompts, computed):
+        rows[prompt.id] = await apply_insights(
+            db, prompt, rows.get(prompt.id), results.merged(reused[prompt.id])
+        )
+        produced = results.from_model()
+        await store_content(
+            db,
+            hashes[prompt.id],
+            scorecard=produced.scorecard,
+            semantic_profile=produced.semantic_profile,
+        )
+
+    if InsightKind.related in kinds:
+        await db.flush()
+        for prompt in prompts:
+            row = rows[prompt.id]
+            profile = row.semantic_profile or fallback_profile(prompt)
+            top = await current_neighbors(db, prompt, profile)
+            row.related_prompt_ids = [candidate.id for _, _, candidate in top]
+
+    await db.commit()
+    # Reload server-generated timestamps for every row in one query.
+    await db.execute(
+        select(PromptInsightModel)
+        .where(PromptInsightModel.prompt_id.in_(list(rows)))
+        .execution_options(populate_existing=True)
+    )
+
+    summary = []
+    for prompt in prompts:
+        needs_tags, needs_quality, needs_semantic = plans[prompt.id]
+        done = [
+            kind
+            for kind, needed in (
+                (InsightKind.tags, needs_tags),
+                (InsightKind.quality, needs_quality),
+                (InsightKind.related, needs_semantic),
+            )
+            if needed
+        ]
+        summary.append((rows[prompt.id], done))
+    return summary
@@ -0,0 +1,227 @@
+"""
+Background insight jobs backed by the insight_jobs table.
+
+Workers claim queued rows with ``FOR UPDATE SKIP LOCKED``, so any number of
+workers, in the API process or started separately with
+``python -m app.services.jobs``, can share one queue.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from sqlalchemy import case, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import AsyncSessionLocal
+from ..models import InsightJobModel, InsightJobStatus, InsightKind, PromptBlockModel
+from .change_feed import change_feed
+from .embeddings import load_vector_index, vector_index_sync
+from .insights import ensure_insight, load_existing_tags, refresh_related
+from .openrouter import content_hash
+
+logger = logging.getLogger(__name__)
+
+INSIGHT_WORKERS = int(os.getenv("INSIGHT_WORKERS", "2"))
+INSIGHT_JOB_POLL_SECONDS = float(os.getenv("INSIGHT_JOB_POLL_SECONDS", "2"))
+INSIGHT_JOB_MAX_ATTEMPTS = int(os.getenv("INSIGHT_JOB_MAX_ATTEMPTS", "3"))
+# Running jobs older than this are assumed to belong to a dead worker.
+INSIGHT_JOB_STALE_AFTER = timedelta(minutes=10)
+
+
+async def enqueue_jobs(
+    db: AsyncSession, prompts: list[PromptBlockModel], kinds: list[InsightKind]
+) -> list[InsightJobModel]:
+    """Queue one job per prompt and kind, reusing jobs for unchanged content."""
+    values = [
+        {
+            "id": str(uuid4()),
+            "prompt_id": prompt.id,
+            "content_hash": content_hash(prompt.content),
+            "kind": kind.value,
+        }
+        for prompt in prompts
+        for kind in dict.fromkeys(kinds)
+    ]
+    if not values:
+        return []
+
+    statement = insert(InsightJobModel).values(values)
+    retry_failed = InsightJobModel.status == InsightJobStatus.failed.value
+    statement = statement.on_conflict_do_update(
+        constraint="uq_insight_jobs_dedupe",
+        set_={
+            "status": case(
+                (retry_failed, InsightJobStatus.queued.value), else_=InsightJobModel.status
+            ),
+            "attempts": case((retry_failed, 0), else_=InsightJobModel.attempts),
+            "error": case((retry_failed, None), else_=InsightJobModel.error),
+        },
+    ).returning(InsightJobModel)
+
+    result = await db.scalars(statement)
+    jobs = result.all()
+    await db.commit()
+    return jobs
+
+
+async def get_job(db: AsyncSession, job_id: str) -> InsightJobModel | None:
+    result = await db.execute(select(InsightJobModel).where(InsightJobModel.id == job_id))
+    return result.scalar_one_or_none()
+
+
+async def claim_next_job(db: AsyncSession) -> InsightJobModel | None:
+    next_job = (
+        select(InsightJobModel.id)
+        .where(InsightJobModel.status == InsightJobStatus.queued.value)
+        .order_by(InsightJobModel.created_at.asc())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await db.scalars(
+        update(InsightJobModel)
+        .where(InsightJobModel.id == next_job)
+        .values(
+            status=InsightJobStatus.running.value,
+            attempts=InsightJobModel.attempts + 1,
+            started_at=datetime.now(timezone.utc),
+        )
+        .returning(InsightJobModel)
+    )
+    job = result.one_or_none()
+    await db.commit()
+    return job
+
+
+async def run_job(db: AsyncSession, job: InsightJobModel) -> None:
+    result = await db.execute(select(PromptBlockModel).where(PromptBlockModel.id == job.prompt_id))
+    prompt = result.scalar_one_or_none()
+    if prompt is None:
+        raise LookupError("Prompt not found")
+
+    kind = InsightKind(job.kind)
+    if kind == InsightKind.tags:
+        existing_tags = await load_existing_tags(db)
+        await ensure_insight(db, prompt, update_tags=True, existing_tags=existing_tags)
+    elif kind == InsightKind.quality:
+        await ensure_insight(db, prompt, update_quality=True)
+    else:
+        await refresh_related(db, prompt)
+
+
+async def _finish(job_id: str, error: str | None, attempts: int) -> None:
+    if error is None:
+        status = InsightJobStatus.done
+    elif attempts < INSIGHT_JOB_MAX_ATTEMPTS:
+        status = InsightJobStatus.queued
+    else:
+        status = InsightJobStatus.failed
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(InsightJobModel)
+            .where(InsightJobModel.id == job_id)
+            .values(
+                status=status.value,
+                error=error,
+                finished_at=datetime.now(timezone.utc) if status != InsightJobStatus.queued else None,
+            )
+        )
+        await db.commit()
+
+
+class InsightWorkerPool:
+    """A fixed number of asyncio workers draining the insight queue."""
+
+    def __init__(self, concurrency: int = INSIGHT_WORKERS):
+        self.concurrency = concurrency
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self.concurrency <= 0 or self._tasks:
+            return
+        await self.requeue_stale()
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"insight-worker-{index}")
+            for index in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def requeue_stale(self) -> None:
+        cutoff = datetime.now(timezone.utc) - INSIGHT_JOB_STALE_AFTER
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(InsightJobModel)
+                .where(
+                    InsightJobModel.status == InsightJobStatus.running.value,
+                    InsightJobModel.started_at < cutoff,
+                )
+                .values(status=InsightJobStatus.queued.value)
+            )
+            await db.commit()
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    job = await claim_next_job(db)
+                    if job is not None:
+                        job_id, attempts, error = job.id, job.attempts, None
+                        try:
+                            await run_job(db, job)
+                        except Exception as exc:  # noqa: BLE001 - recorded on the job row
+                            await db.rollback()
+                            logger.exception("Insight job %s failed", job_id)
+                            error = str(exc) or exc.__class__.__name__
+                if job is not None:
+                    await _finish(job_id, error, attempts)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - keep the worker alive on DB hiccups
+                logger.exception("Insight worker loop error")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), INSIGHT_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+worker_pool = InsightWorkerPool()
+
+
+async def _run_standalone() -> None:
+    async with AsyncSessionLocal() as db:
+        await load_vector_index(db)
+    # Related prompts are looked up in this process's index, so keep it current too.
+    await change_feed.start()
+    await vector_index_sync.start()
+    pool = InsightWorkerPool(max(1, INSIGHT_WORKERS))
+    await pool.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await pool.stop()
+        await vector_index_sync.stop()
+        await change_feed.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run_standalone())
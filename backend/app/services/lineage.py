@@ -0,0 +1,171 @@
+"""
+Closure table of prompt ancestry, kept in step with parent_prompt_id.
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import and_, delete, func, literal, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from ..models import PromptBlockModel, PromptLineageModel
+
+BACKFILL_LINEAGE_SQL = """
+INSERT INTO prompt_lineage (ancestor_id, descendant_id, depth)
+WITH RECURSIVE walk (ancestor_id, descendant_id, depth, path) AS (
+    SELECT id, id, 0, ARRAY[id]
+    FROM prompt_blocks
+    WHERE id NOT IN (SELECT descendant_id FROM prompt_lineage WHERE depth = 0)
+    UNION ALL
+    SELECT parent.id, walk.descendant_id, walk.depth + 1, walk.path || parent.id
+    FROM walk
+    JOIN prompt_blocks child ON child.id = walk.ancestor_id
+    JOIN prompt_blocks parent ON parent.id = child.parent_prompt_id
+    WHERE NOT parent.id = ANY (walk.path)
+)
+SELECT ancestor_id, descendant_id, depth FROM walk
+ON CONFLICT DO NOTHING
+"""
+
+
+async def add_to_lineage(db: AsyncSession, prompt_id: str, parent_id: str | None) -> None:
+    """Record a new prompt under ``parent_id``. The caller owns the commit."""
+    rows = select(
+        literal(prompt_id).label("ancestor_id"),
+        literal(prompt_id).label("descendant_id"),
+        literal(0).label("depth"),
+    )
+    if parent_id:
+        above = select(
+            PromptLineageModel.ancestor_id,
+            literal(prompt_id),
+            PromptLineageModel.depth + 1,
+        ).where(PromptLineageModel.descendant_id == parent_id)
+        rows = rows.union_all(above)
+    await db.execute(
+        insert(PromptLineageModel)
+        .from_select(["ancestor_id", "descendant_id", "depth"], rows)
+        .on_conflict_do_nothing()
+    )
+
+
+def _subtree(prompt_id: str):
+    return select(PromptLineageModel.descendant_id).where(
+        PromptLineageModel.ancestor_id == prompt_id
+    )
+
+
+def _ancestry(prompt_id: str):
+    return select(PromptLineageModel.ancestor_id).where(
+        PromptLineageModel.descendant_id == prompt_id
+    )
+
+
+async def _reroot(db: AsyncSession, prompt_ids) -> None:
+    """Point root_prompt_id of ``prompt_ids`` (a list or subquery) at their topmost ancestor."""
+    root = (
+        select(PromptLineageModel.ancestor_id)
+        .where(PromptLineageModel.descendant_id == PromptBlockModel.id)
+        .order_by(PromptLineageModel.depth.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(PromptBlockModel)
+        .where(PromptBlockModel.id.in_(prompt_ids))
+        .values(root_prompt_id=func.coalesce(root, PromptBlockModel.id))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def move_in_lineage(db: AsyncSession, prompt_id: str, parent_id: str | None) -> None:
+    """Re-parent a prompt together with its subtree, which takes on the root of its new
+    parent. The caller owns the commit."""
+    if parent_id:
+        cycle = await db.scalar(
+            select(func.count()).where(
+                PromptLineageModel.ancestor_id == prompt_id,
+                PromptLineageModel.descendant_id == parent_id,
+            )
+        )
+        if cycle:
+            raise ValueError("A prompt cannot descend from itself")
+
+    # Detach the subtree from everything above it.
+    await db.execute(
+        delete(PromptLineageModel).where(
+            PromptLineageModel.descendant_id.in_(_subtree(prompt_id)),
+            PromptLineageModel.ancestor_id.not_in(_subtree(prompt_id)),
+        )
+    )
+    if not parent_id:
+        await _reroot(db, _subtree(prompt_id))
+        return
+
+    above = aliased(PromptLineageModel)
+    below = aliased(PromptLineageModel)
+    await db.execute(
+        insert(PromptLineageModel)
+        .from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(above.ancestor_id, below.descendant_id, above.depth + below.depth + 1)
+            .select_from(above)
+            .join(below, and_(above.descendant_id == parent_id, below.ancestor_id == prompt_id)),
+        )
+        .on_conflict_do_nothing()
+    )
+    await _reroot(db, _subtree(prompt_id))
+
+
+async def remove_from_lineage(db: AsyncSession, prompt_id: str) -> None:
+    """Drop every path through a deleted prompt; its children become roots of their own
+    subtrees. The caller owns the commit."""
+    orphaned = list(
+        (await db.scalars(_subtree(prompt_id).where(PromptLineageModel.depth > 0))).all()
+    )
+    await db.execute(
+        delete(PromptLineageModel).where(
+            PromptLineageModel.ancestor_id.in_(_ancestry(prompt_id)),
+            PromptLineageModel.descendant_id.in_(_subtree(prompt_id)),
+        )
+    )
+    if orphaned:
+        await _reroot(db, orphaned)
+
+
+async def load_family(
+    db: AsyncSession, prompt_id: str
+) -> list[tuple[PromptBlockModel, int, int, int]]:
+    """Every prompt sharing the topmost ancestor of ``prompt_id``, breadth-first, as
+    (prompt, depth below the root, child count, subtree size including itself)."""
+    root = (
+        select(PromptLineageModel.ancestor_id)
+        .where(PromptLineageModel.descendant_id == prompt_id)
+        .order_by(PromptLineageModel.depth.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    family = aliased(PromptLineageModel)
+    below = aliased(PromptLineageModel)
+    result = await db.execute(
+        select(
+            PromptBlockModel,
+            family.depth,
+            func.count().filter(below.depth == 1),
+            func.count(),
+        )
+        .select_from(family)
+        .join(PromptBlockModel, PromptBlockModel.id == family.descendant_id)
+        .join(below, below.ancestor_id == family.descendant_id)
+        .where(family.ancestor_id == root)
+        .group_by(PromptBlockModel.id, family.depth)
+        .order_by(family.depth, PromptBlockModel.created_at, PromptBlockModel.id)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def backfill_lineage(db: AsyncSession) -> None:
+    """Add closure rows for prompts written before the table existed or outside the API."""
+    await db.execute(text(BACKFILL_LINEAGE_SQL))
+    await db.commit()
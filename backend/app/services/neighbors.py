@@ -0,0 +1,300 @@
+"""
+Related-prompt scoring and the precomputed top-k neighbour graph.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from ..models import PromptBlockModel, PromptInsightModel, PromptNeighborModel
+from .embeddings import embed_profile, vector_index
+from .openrouter import content_hash, heuristic_semantic_profile
+from .search_index import profile_terms
+
+RELATED_LIMIT = 6
+# Neighbours pulled from the vector index before exact re-scoring.
+RELATED_CANDIDATES = 48
+
+
+def semantic_similarity(
+    source_profile: dict[str, Any], target_profile: dict[str, Any], query_terms: set[str] | None = None
+) -> tuple[float, str]:
+    source_terms = profile_terms(source_profile)
+    target_terms = profile_terms(target_profile)
+    if not source_terms or not target_terms:
+        return 0.0, "low-confidence match"
+
+    overlap = source_terms & target_terms
+    union = source_terms | target_terms
+    score = len(overlap) / max(1, len(union))
+
+    if query_terms:
+        query_overlap = query_terms & target_terms
+        score += min(0.45, len(query_overlap) * 0.08)
+        if query_overlap:
+            return score, "similar intent"
+
+    if source_profile.get("output_style") == target_profile.get("output_style"):
+        score += 0.1
+        if overlap:
+            return score, "same output style"
+
+    if overlap:
+        return score, "overlapping constraints"
+    return score, "semantic overlap"
+
+
+def fallback_profile(prompt: PromptBlockModel) -> dict[str, Any]:
+    return heuristic_semantic_profile(prompt.title, prompt.content, list(prompt.tags or []))
+
+
+async def load_profiles(
+    db: AsyncSession, prompts: list[PromptBlockModel]
+) -> dict[str, dict[str, Any]]:
+    """Resolve the current semantic profile for many prompts with a single query."""
+    result = await db.execute(
+        select(PromptInsightModel).where(
+            PromptInsightModel.prompt_id.in_([prompt.id for prompt in prompts])
+        )
+    )
+    rows = {row.prompt_id: row for row in result.scalars().all()}
+
+    profiles = {}
+    for prompt in prompts:
+        row = rows.get(prompt.id)
+        if row and row.semantic_profile and row.content_hash == content_hash(prompt.content):
+            profiles[prompt.id] = row.semantic_profile
+        else:
+            profiles[prompt.id] = fallback_profile(prompt)
+    return profiles
+
+
+async def rank_related(
+    db: AsyncSession,
+    prompt: PromptBlockModel,
+    source_profile: dict[str, Any],
+    *,
+    limit: int = RELATED_LIMIT,
+) -> list[tuple[float, str, PromptBlockModel]]:
+    """Score the approximate nearest neighbours of a prompt with semantic_similarity."""
+    neighbours = vector_index.search(
+        embed_profile(source_profile), RELATED_CANDIDATES, exclude={prompt.id}
+    )
+    if not neighbours:
+        return []
+
+    result = await db.execute(
+        select(PromptBlockModel).where(
+            PromptBlockModel.id.in_([prompt_id for prompt_id, _ in neighbours])
+        )
+    )
+    candidates = result.scalars().all()
+    profiles = await load_profiles(db, candidates)
+
+    scored = []
+    for candidate in candidates:
+        score, reason = semantic_similarity(source_profile, profiles[candidate.id])
+        if score <= 0:
+            continue
+        scored.append((score, reason, candidate))
+
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored[:limit]
+
+
+def sql_content_hash(column):
+    """SQL counterpart of ``content_hash`` for freshness checks inside queries."""
+    return func.encode(func.sha256(func.convert_to(column, "UTF8")), "hex")
+
+
+@dataclass
+class NeighborList:
+    fresh: bool
+    computed_at: datetime | None = None
+    # (score, reason, neighbour unchanged since scoring, neighbour prompt)
+    entries: list[tuple[float, str, bool, PromptBlockModel]] = field(default_factory=list)
+
+
+def _entries(
+    scored: list[tuple[float, str, PromptBlockModel]]
+) -> list[tuple[float, str, str, str]]:
+    return [
+        (score, reason, candidate.id, content_hash(candidate.content))
+        for score, reason, candidate in scored
+    ]
+
+
+async def _store_list(
+    db: AsyncSession, owner_id: str, source_hash: str, entries: list[tuple[float, str, str, str]]
+) -> None:
+    await db.execute(delete(PromptNeighborModel).where(PromptNeighborModel.prompt_id == owner_id))
+    if entries:
+        await db.execute(
+            insert(PromptNeighborModel),
+            [
+                {
+                    "prompt_id": owner_id,
+                    "neighbor_id": neighbor_id,
+                    "rank": rank,
+                    "score": score,
+                    "reason": reason,
+                    "source_hash": source_hash,
+                    "neighbor_hash": neighbor_hash,
+                }
+                for rank, (score, reason, neighbor_id, neighbor_hash) in enumerate(entries)
+            ],
+        )
+    await db.execute(
+        update(PromptInsightModel)
+        .where(PromptInsightModel.prompt_id == owner_id)
+        .values(
+            related_prompt_ids=[neighbor_id for _, _, neighbor_id, _ in entries],
+            updated_at=PromptInsightModel.updated_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _recompute_list(
+    db: AsyncSession, owner: PromptBlockModel, profile: dict[str, Any]
+) -> list[tuple[float, str, PromptBlockModel]]:
+    top = await rank_related(db, owner, profile)
+    await _store_list(db, owner.id, content_hash(owner.content), _entries(top))
+    return top
+
+
+async def update_neighbors(
+    db: AsyncSession, prompt: PromptBlockModel, profile: dict[str, Any]
+) -> list[tuple[float, str, PromptBlockModel]]:
+    """Store a prompt's neighbour list and patch only the lists it enters or leaves.
+
+    Call after the prompt's vector has been indexed. The caller owns the commit."""
+    scored = await rank_related(db, prompt, profile, limit=RELATED_CANDIDATES)
+    top = scored[:RELATED_LIMIT]
+    current_hash = content_hash(prompt.content)
+    await _store_list(db, prompt.id, current_hash, _entries(top))
+
+    # Stored lists owned by a close candidate or already holding this prompt.
+    listed_by = select(PromptNeighborModel.prompt_id).where(
+        PromptNeighborModel.neighbor_id == prompt.id
+    )
+    result = await db.execute(
+        select(PromptNeighborModel)
+        .where(
+            or_(
+                PromptNeighborModel.prompt_id.in_([candidate.id for _, _, candidate in scored]),
+                PromptNeighborModel.prompt_id.in_(listed_by),
+            ),
+            PromptNeighborModel.prompt_id != prompt.id,
+        )
+        .order_by(PromptNeighborModel.prompt_id, PromptNeighborModel.rank)
+    )
+    lists: dict[str, list[PromptNeighborModel]] = {}
+    for entry in result.scalars().all():
+        lists.setdefault(entry.prompt_id, []).append(entry)
+    if not lists:
+        return top
+
+    result = await db.execute(select(PromptBlockModel).where(PromptBlockModel.id.in_(lists)))
+    owners = result.scalars().all()
+    profiles = await load_profiles(db, owners)
+
+    for owner in owners:
+        entries = lists[owner.id]
+        previous = next((entry for entry in entries if entry.neighbor_id == prompt.id), None)
+        score, reason = semantic_similarity(profiles[owner.id], profile)
+        if previous is not None and score < previous.score:
+            # A prompt outside the list may now outrank this one.
+            await _recompute_list(db, owner, profiles[owner.id])
+            continue
+
+        kept = [
+            (entry.score, entry.reason, entry.neighbor_id, entry.neighbor_hash)
+            for entry in entries
+            if entry.neighbor_id != prompt.id
+        ]
+        if score > 0:
+            kept.append((score, reason, prompt.id, current_hash))
+        kept.sort(key=lambda item: item[0], reverse=True)
+        kept = kept[:RELATED_LIMIT]
+        if previous is None and all(neighbor_id != prompt.id for _, _, neighbor_id, _ in kept):
+            continue
+        await _store_list(db, owner.id, entries[0].source_hash, kept)
+
+    return top
+
+
+async def drop_neighbors(db: AsyncSession, prompt_id: str) -> None:
+    """Forget a deleted prompt and refill the lists that held it. The caller owns the commit."""
+    listed_by = select(PromptNeighborModel.prompt_id).where(
+        PromptNeighborModel.neighbor_id == prompt_id
+    )
+    result = await db.execute(
+        select(PromptBlockModel).where(
+            PromptBlockModel.id.in_(listed_by), PromptBlockModel.id != prompt_id
+        )
+    )
+    owners = result.scalars().all()
+    await db.execute(
+        delete(PromptNeighborModel).where(
+            or_(
+                PromptNeighborModel.prompt_id == prompt_id,
+                PromptNeighborModel.neighbor_id == prompt_id,
+            )
+        )
+    )
+
+    profiles = await load_profiles(db, owners)
+    for owner in owners:
+        await _recompute_list(db, owner, profiles[owner.id])
+
+
+async def read_neighbors(db: AsyncSession, prompt_id: str) -> NeighborList | None:
+    """Load a prompt's stored neighbours in one query; None if the prompt does not exist."""
+    neighbor = aliased(PromptBlockModel)
+    result = await db.execute(
+        select(
+            (sql_content_hash(PromptBlockModel.content) == PromptNeighborModel.source_hash).label(
+                "fresh"
+            ),
+            PromptNeighborModel.computed_at,
+            PromptNeighborModel.score,
+            PromptNeighborModel.reason,
+            (sql_content_hash(neighbor.content) == PromptNeighborModel.neighbor_hash).label(
+                "neighbor_fresh"
+            ),
+            neighbor,
+        )
+        .select_from(PromptBlockModel)
+        .outerjoin(PromptNeighborModel, PromptNeighborModel.prompt_id == PromptBlockModel.id)
+        .outerjoin(neighbor, neighbor.id == PromptNeighborModel.neighbor_id)
+        .where(PromptBlockModel.id == prompt_id)
+        .order_by(PromptNeighborModel.rank)
+    )
+    rows = result.all()
+    if not rows:
+        return None
+
+    stored = NeighborList(fresh=bool(rows[0].fresh), computed_at=rows[0].computed_at)
+    for row in rows:
+        if row[-1] is None:
+            continue
+        stored.entries.append((row.score, row.reason, bool(row.neighbor_fresh), row[-1]))
+    return stored
+
+
+async def current_neighbors(
+    db: AsyncSession, prompt: PromptBlockModel, profile: dict[str, Any]
+) -> list[tuple[float, str, PromptBlockModel]]:
+    """Serve the stored list while it and its members are unchanged, else rebuild it."""
+    stored = await read_neighbors(db, prompt.id)
+    if stored and stored.fresh and stored.entries and all(fresh for _, _, fresh, _ in stored.entries):
+        return [(score, reason, candidate) for score, reason, _, candidate in stored.entries]
+    return await update_neighbors(db, prompt, profile)
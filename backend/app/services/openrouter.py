@@ -4,15 +4,21 @@ OpenRouter helpers with deterministic local fallbacks.
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import json
 import os
 import re
-import urllib.error
-import urllib.request
 from typing import Any
 
+import httpx
+
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+OPENROUTER_TIMEOUT = float(os.getenv("OPENROUTER_TIMEOUT", "35"))
+OPENROUTER_CONNECT_TIMEOUT = float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "5"))
+OPENROUTER_MAX_CONCURRENCY = int(os.getenv("OPENROUTER_MAX_CONCURRENCY", "8"))
+OPENROUTER_MAX_KEEPALIVE = int(os.getenv("OPENROUTER_MAX_KEEPALIVE", "8"))
 OPENROUTER_ANALYSIS_MODEL = os.getenv(
     "OPENROUTER_ANALYSIS_MODEL", "openai/gpt-4o-mini"
 )
@@ -75,8 +81,45 @@ def _extract_json_blob(raw: str) -> dict[str, Any] | list[Any] | None:
     return None
 
 
-def _call_openrouter(
-    model: str, system_prompt: str, user_prompt: str
+_client: httpx.AsyncClient | None = None
+_semaphore: asyncio.Semaphore | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared keep-alive client, creating it on first use."""
+    global _client, _semaphore
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=OPENROUTER_BASE_URL,
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "HTTP-Referer": "https://prompts.ashref.tn",
+                "X-Title": "prompts.ashref.tn",
+            },
+            limits=httpx.Limits(
+                max_connections=OPENROUTER_MAX_CONCURRENCY,
+                max_keepalive_connections=OPENROUTER_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(OPENROUTER_TIMEOUT, connect=OPENROUTER_CONNECT_TIMEOUT),
+        )
+        _semaphore = asyncio.Semaphore(OPENROUTER_MAX_CONCURRENCY)
+    return _client
+
+
+async def close_client() -> None:
+    global _client, _semaphore
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _semaphore = None
+
+
+async def _call_openrouter(
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    *,
+    timeout: float | None = None,
 ) -> dict[str, Any] | list[Any] | None:
     if not OPENROUTER_API_KEY:
         return None
@@ -91,22 +134,21 @@ def _call_openrouter(
         "response_format": {"type": "json_object"},
     }
 
-    request = urllib.request.Request(
-        "https://openrouter.ai/api/v1/chat/completions",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://prompts.ashref.tn",
-            "X-Title": "prompts.ashref.tn",
-        },
-        method="POST",
+    client = get_client()
+    request_timeout = (
+        httpx.Timeout(timeout, connect=OPENROUTER_CONNECT_TIMEOUT)
+        if timeout is not None
+        else httpx.USE_CLIENT_DEFAULT
     )
 
     try:
-        with urllib.request.urlopen(request, timeout=35) as response:
-            body = json.loads(response.read().decode("utf-8"))
-    except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError, json.JSONDecodeError):
+        async with _semaphore:
+            response = await client.post(
+                "/chat/completions", json=payload, timeout=request_timeout
+            )
+            response.raise_for_status()
+            body = response.json()
+    except (httpx.HTTPError, json.JSONDecodeError):
         return None
 
     content = (
@@ -238,8 +280,13 @@ def heuristic_semantic_profile(title: str, content: str, tags: list[str]) -> dic
     }
 
 
-def suggest_tags(
-    title: str, content: str, existing_tags: list[str], current_tags: list[str]
+async def suggest_tags(
+    title: str,
+    content: str,
+    existing_tags: list[str],
+    current_tags: list[str],
+    *,
+    timeout: float | None = None,
 ) -> dict[str, Any]:
     system_prompt = (
         "You analyze prompts. Return JSON with keys suggested_tags and merge_suggestions. "
@@ -254,7 +301,9 @@ def suggest_tags(
             "current_tags": current_tags,
         }
     )
-    response = _call_openrouter(OPENROUTER_ANALYSIS_MODEL, system_prompt, user_prompt)
+    response = await _call_openrouter(
+        OPENROUTER_ANALYSIS_MODEL, system_prompt, user_prompt, timeout=timeout
+    )
     if isinstance(response, dict):
         tags = response.get("suggested_tags") or []
         merges = response.get("merge_suggestions") or []
@@ -275,26 +324,41 @@ def suggest_tags(
     return heuristic_tag_suggestions(f"{title}\n{content}", existing_tags)
 
 
-def analyze_quality(title: str, content: str) -> dict[str, Any]:
+async def analyze_quality(
+    title: str, content: str, *, timeout: float | None = None, fallback: bool = True
+) -> dict[str, Any] | None:
+    """Score a prompt with the model, or heuristically (``None`` without ``fallback``)."""
     system_prompt = (
         "You score prompts. Return JSON with clarity, specificity, constraints, "
         "output_definition, reuse_potential, ambiguity_risk, summary, recommendations. "
         "Scores must be integers from 1 to 10."
     )
     user_prompt = json.dumps({"title": title, "content": content})
-    response = _call_openrouter(OPENROUTER_ANALYSIS_MODEL, system_prompt, user_prompt)
+    response = await _call_openrouter(
+        OPENROUTER_ANALYSIS_MODEL, system_prompt, user_prompt, timeout=timeout
+    )
     if isinstance(response, dict):
         return response
-    return heuristic_scorecard(content)
-
-
-def build_semantic_profile(title: str, content: str, tags: list[str]) -> dict[str, Any]:
+    return heuristic_scorecard(content) if fallback else None
+
+
+async def build_semantic_profile(
+    title: str,
+    content: str,
+    tags: list[str],
+    *,
+    timeout: float | None = None,
+    fallback: bool = True,
+) -> dict[str, Any] | None:
+    """Profile a prompt with the model, or heuristically (``None`` without ``fallback``)."""
     system_prompt = (
         "You create compact semantic search profiles. Return JSON with intent, output_style, "
         "keywords, constraints, personas. Keep keywords short."
     )
     user_prompt = json.dumps({"title": title, "content": content, "tags": tags})
-    response = _call_openrouter(OPENROUTER_SEMANTIC_MODEL, system_prompt, user_prompt)
+    response = await _call_openrouter(
+        OPENROUTER_SEMANTIC_MODEL, system_prompt, user_prompt, timeout=timeout
+    )
     if isinstance(response, dict):
         return response
-    return heuristic_semantic_profile(title, content, tags)
+    return heuristic_semantic_profile(title, content, tags) if fallback else None
@@ -0,0 +1,167 @@
+"""
+In-process cache of serialized, precompressed public stack pages.
+
+Writes in this process invalidate their stack right after commit; writes in other
+workers reach us through ``change_feed``. The TTL only bounds staleness while the
+feed is disconnected.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import PromptBlock, PromptBlockModel, PublicStackResponse, Stack, StackModel
+from .change_feed import RESYNC, ChangeBatch, change_feed
+from .etags import Validators
+
+PUBLIC_CACHE_TTL_SECONDS = float(os.getenv("PUBLIC_CACHE_TTL_SECONDS", "300"))
+PUBLIC_CACHE_MAX_AGE = int(os.getenv("PUBLIC_CACHE_MAX_AGE", "60"))
+PUBLIC_CACHE_MAX_ENTRIES = int(os.getenv("PUBLIC_CACHE_MAX_ENTRIES", "1000"))
+# Middle levels: near the best ratio for JSON at a fraction of the CPU of the maximum.
+PUBLIC_GZIP_LEVEL = int(os.getenv("PUBLIC_GZIP_LEVEL", "6"))
+PUBLIC_BROTLI_QUALITY = int(os.getenv("PUBLIC_BROTLI_QUALITY", "5"))
+
+
+async def load_public_stack(db: AsyncSession, slug: str) -> PublicStackResponse | None:
+    result = await db.execute(select(StackModel).where(StackModel.slug == slug))
+    stack = result.scalar_one_or_none()
+
+    if not stack or not stack.is_published:
+        return None
+
+    prompts_result = await db.execute(
+        select(PromptBlockModel)
+        .where(PromptBlockModel.stack_id == stack.id)
+        .order_by(PromptBlockModel.stack_order.asc().nulls_last(), PromptBlockModel.created_at.desc())
+    )
+    prompts = prompts_result.scalars().all()
+
+    return PublicStackResponse(
+        stack=Stack.model_validate(stack),
+        prompts=[PromptBlock.model_validate(prompt) for prompt in prompts],
+    )
+
+
+@dataclass
+class PublicPage:
+    stack_id: str
+    body: bytes
+    validators: Validators
+    expires_at: float
+    # Content-Encoding -> compressed body
+    encoded: dict[str, bytes] = field(default_factory=dict)
+
+    def negotiate(self, accept_encoding: str) -> tuple[str | None, bytes]:
+        """Pick the smallest stored encoding the client accepts."""
+        accepted = set()
+        for part in accept_encoding.lower().split(","):
+            name, _, params = part.partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(name.strip())
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.encoded:
+                return encoding, self.encoded[encoding]
+        return None, self.body
+
+
+def _compress(body: bytes) -> dict[str, bytes]:
+    encoded = {"gzip": gzip.compress(body, compresslevel=PUBLIC_GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        encoded["br"] = brotli.compress(body, quality=PUBLIC_BROTLI_QUALITY)
+    return encoded
+
+
+async def build_page(stack_id: str, body: bytes) -> PublicPage:
+    """Compress off the event loop so a large stack does not stall other requests."""
+    encoded = await asyncio.to_thread(_compress, body)
+    return PublicPage(
+        stack_id=stack_id,
+        body=body,
+        validators=Validators(
+            etag=f'"{hashlib.sha256(body).hexdigest()}"',
+            last_modified=datetime.now(timezone.utc),
+            cache_control=f"public, max-age={PUBLIC_CACHE_MAX_AGE}",
+        ),
+        expires_at=time.monotonic() + PUBLIC_CACHE_TTL_SECONDS,
+        encoded=encoded,
+    )
+
+
+class PublicStackCache:
+    """Pages keyed by slug, dropped whenever their stack or its blocks change."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._pages: dict[str, PublicPage] = {}
+        self._slug_of: dict[str, str] = {}
+        # Bumped on every invalidation so a page built from a read that raced a write is
+        # not stored after the write invalidated the cache.
+        self.generation = 0
+
+    def get(self, slug: str) -> PublicPage | None:
+        page = self._pages.get(slug)
+        if page is not None and page.expires_at < time.monotonic():
+            self._drop(slug)
+            return None
+        return page
+
+    def put(self, slug: str, page: PublicPage, generation: int) -> None:
+        if generation != self.generation:
+            return
+        if slug not in self._pages and len(self._pages) >= self.max_entries:
+            self._drop(min(self._pages, key=lambda key: self._pages[key].expires_at))
+        self._pages[slug] = page
+        self._slug_of[page.stack_id] = slug
+
+    def invalidate_stack(self, stack_id: str | None) -> None:
+        if stack_id is None:
+            return
+        self.generation += 1
+        slug = self._slug_of.get(stack_id)
+        if slug is not None:
+            self._drop(slug)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._pages.clear()
+        self._slug_of.clear()
+
+    def on_changes(self, batch: ChangeBatch) -> None:
+        if batch is RESYNC:
+            self.clear()
+            return
+        _, events = batch
+        for event in events:
+            if event.entity == "stacks":
+                self.invalidate_stack(event.id)
+            elif event.entity == "blocks":
+                # Catch-up events do not say which stacks a block left or joined.
+                if event.stack_ids is None:
+                    self.clear()
+                    return
+                for stack_id in event.stack_ids:
+                    self.invalidate_stack(stack_id)
+
+    def _drop(self, slug: str) -> None:
+        page = self._pages.pop(slug, None)
+        if page is not None:
+            self._slug_of.pop(page.stack_id, None)
+
+
+public_cache = PublicStackCache(PUBLIC_CACHE_MAX_ENTRIES)
+change_feed.add_listener(public_cache.on_changes)
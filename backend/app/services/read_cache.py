@@ -0,0 +1,147 @@
+"""
+In-process cache of serialized collection reads, kept coherent across workers by the change feed.
+
+Writes in this process invalidate their entity right after commit; writes in any other
+worker or replica reach us as NOTIFY events through ``change_feed``. The cache only
+serves while that channel is listening, so a lost connection degrades to plain reads
+instead of stale ones.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .change_feed import RESYNC, ChangeBatch, change_feed
+from .etags import Validators, table_validators
+
+READ_CACHE_MAX_BYTES = int(os.getenv("READ_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+@dataclass
+class CachedRead:
+    body: bytes
+    validators: Validators
+
+
+class ReadCache:
+    """LRU of response bodies keyed by change-feed entity, bounded by total size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, CachedRead] = OrderedDict()
+        self._size = 0
+        # A load records the version it started at and is only stored if no
+        # invalidation happened meanwhile; clear() moves every entity on at once.
+        self._epoch = 0
+        self._versions: dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and change_feed.connected
+
+    def version(self, entity: str) -> tuple[int, int]:
+        return self._epoch, self._versions.get(entity, 0)
+
+    def get(self, entity: str) -> CachedRead | None:
+        if not self.enabled:
+            self.bypassed += 1
+            return None
+        entry = self._entries.get(entity)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(entity)
+        self.hits += 1
+        return entry
+
+    def put(self, entity: str, version: tuple[int, int], entry: CachedRead) -> None:
+        if not self.enabled or version != self.version(entity):
+            return
+        if len(entry.body) > self.max_bytes:
+            return
+        self._discard(entity)
+        self._entries[entity] = entry
+        self._size += len(entry.body)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted.body)
+            self.evictions += 1
+
+    def invalidate(self, *entities: str) -> None:
+        for entity in entities:
+            self._versions[entity] = self._versions.get(entity, 0) + 1
+            if self._discard(entity):
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._entries.clear()
+        self._size = 0
+
+    def on_changes(self, batch: ChangeBatch) -> None:
+        if batch is RESYNC:
+            self.clear()
+            return
+        _, events = batch
+        self.invalidate(*{event.entity for event in events})
+
+    def _discard(self, entity: str) -> bool:
+        entry = self._entries.pop(entity, None)
+        if entry is None:
+            return False
+        self._size -= len(entry.body)
+        return True
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+read_cache = ReadCache(READ_CACHE_MAX_BYTES)
+change_feed.add_listener(read_cache.on_changes)
+
+
+async def cached_collection(
+    request: Request,
+    db: AsyncSession,
+    entity: str,
+    table: str,
+    load: Callable[[], Awaitable[bytes]],
+) -> Response:
+    """Serve a collection from the read cache, loading and storing it on a miss.
+
+    A hit costs no queries; conditional requests are answered from the cached validators."""
+    entry = read_cache.get(entity)
+    if entry is None:
+        version = read_cache.version(entity)
+        validators = await table_validators(db, table)
+        if validators.matches(request):
+            return validators.not_modified()
+        entry = CachedRead(body=await load(), validators=validators)
+        read_cache.put(entity, version, entry)
+
+    if entry.validators.matches(request):
+        return entry.validators.not_modified()
+    return Response(
+        content=entry.body, media_type="application/json", headers=entry.validators.headers()
+    )
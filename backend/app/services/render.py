@@ -0,0 +1,202 @@
+"""
+Server-side composition rendering with an in-process output cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import (
+    CompositionItemModel,
+    CompositionModel,
+    CompositionSection,
+    PromptBlockModel,
+    RenderPreset,
+)
+
+RENDER_CACHE_MAX_ENTRIES = int(os.getenv("RENDER_CACHE_MAX_ENTRIES", "512"))
+OPENROUTER_EXPORT_MODEL = "openai/gpt-4o-mini"
+
+# Sections render in this order; items keep their position inside a section.
+SECTION_ORDER = {section.value: index for index, section in enumerate(CompositionSection)}
+SECTION_LABELS = {
+    CompositionSection.role.value: "Role",
+    CompositionSection.context.value: "Context",
+    CompositionSection.rules.value: "Rules",
+    CompositionSection.examples.value: "Examples",
+    CompositionSection.output.value: "Output",
+    CompositionSection.freeform.value: "Freeform",
+}
+
+
+@dataclass
+class RenderedItem:
+    section: str
+    position: int
+    content: str
+
+
+def compile_items(items: list[RenderedItem], preset: RenderPreset) -> str:
+    """Assemble prompt text the way the studio's export presets do."""
+    ordered = sorted(items, key=lambda item: (SECTION_ORDER[item.section], item.position))
+    if preset == RenderPreset.openrouter:
+        messages = [
+            {
+                "role": "system" if item.section == CompositionSection.role.value else "user",
+                "content": item.content,
+            }
+            for item in ordered
+        ]
+        return json.dumps({"model": OPENROUTER_EXPORT_MODEL, "messages": messages}, indent=2)
+
+    parts = []
+    for item in ordered:
+        label = SECTION_LABELS[item.section]
+        if preset == RenderPreset.claude:
+            parts.append(f"{label.upper()}\n{item.content}")
+        elif preset == RenderPreset.gemini:
+            parts.append(f"## {label}\n{item.content}")
+        else:
+            parts.append(f"[{label}]\n{item.content}")
+    return "\n\n".join(parts)
+
+
+class RenderCache:
+    """LRU of rendered output with a reverse index from prompt id to compositions.
+
+    Entries are validated against a fresh key on every read, so invalidation only
+    reclaims memory early; a missed invalidation can never serve stale text."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, RenderPreset], tuple[str, str]] = OrderedDict()
+        self._prompts_of: dict[str, set[str]] = {}
+        self._compositions_of: dict[str, set[str]] = {}
+
+    def get(self, composition_id: str, preset: RenderPreset, key: str) -> str | None:
+        entry = self._entries.get((composition_id, preset))
+        if entry is None or entry[0] != key:
+            return None
+        self._entries.move_to_end((composition_id, preset))
+        return entry[1]
+
+    def put(
+        self,
+        composition_id: str,
+        preset: RenderPreset,
+        key: str,
+        text: str,
+        prompt_ids: set[str],
+    ) -> None:
+        self._entries[(composition_id, preset)] = (key, text)
+        self._entries.move_to_end((composition_id, preset))
+        for prompt_id in self._prompts_of.get(composition_id, set()) - prompt_ids:
+            self._unlink(prompt_id, composition_id)
+        self._prompts_of[composition_id] = set(prompt_ids)
+        for prompt_id in prompt_ids:
+            self._compositions_of.setdefault(prompt_id, set()).add(composition_id)
+        while len(self._entries) > self.max_entries:
+            (evicted, _), _ = self._entries.popitem(last=False)
+            if not any(cached == evicted for cached, _ in self._entries):
+                self.invalidate_composition(evicted)
+
+    def invalidate_composition(self, composition_id: str) -> None:
+        for preset in RenderPreset:
+            self._entries.pop((composition_id, preset), None)
+        for prompt_id in self._prompts_of.pop(composition_id, set()):
+            self._unlink(prompt_id, composition_id)
+
+    def invalidate_prompt(self, prompt_id: str) -> None:
+        """Drop only the renders that embed ``prompt_id``."""
+        for composition_id in list(self._compositions_of.get(prompt_id, ())):
+            self.invalidate_composition(composition_id)
+
+    def _unlink(self, prompt_id: str, composition_id: str) -> None:
+        compositions = self._compositions_of.get(prompt_id)
+        if compositions is not None:
+            compositions.discard(composition_id)
+            if not compositions:
+                del self._compositions_of[prompt_id]
+
+
+render_cache = RenderCache(RENDER_CACHE_MAX_ENTRIES)
+
+
+async def render_key(
+    db: AsyncSession, composition_id: str, preset: RenderPreset
+) -> str | None:
+    """Hash the item and referenced prompt versions; None if the composition is missing.
+
+    Only the change_seq stamps are read, so a cache hit never touches prompt content."""
+    item_state = func.concat_ws(
+        ":",
+        CompositionItemModel.id,
+        CompositionItemModel.change_seq,
+        PromptBlockModel.id,
+        PromptBlockModel.change_seq,
+    )
+    result = await db.execute(
+        select(
+            func.string_agg(
+                item_state,
+                aggregate_order_by(literal_column("','"), CompositionItemModel.id),
+            )
+        )
+        .select_from(CompositionModel)
+        .outerjoin(CompositionItemModel, CompositionItemModel.composition_id == CompositionModel.id)
+        .outerjoin(PromptBlockModel, PromptBlockModel.id == CompositionItemModel.source_prompt_id)
+        .where(CompositionModel.id == composition_id)
+        .group_by(CompositionModel.id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None
+    return hashlib.sha256(f"{preset.value}|{row[0] or ''}".encode("utf-8")).hexdigest()
+
+
+async def render_composition(
+    db: AsyncSession, composition_id: str, preset: RenderPreset
+) -> tuple[str, str, bool] | None:
+    """Return ``(key, text, cached)`` for a composition, or None if it does not exist.
+
+    Must be the first statement on ``db``: the key and the items are read in one
+    snapshot, so an edit landing between the two cannot be cached under the old key."""
+    await db.connection(
+        execution_options={"isolation_level": "REPEATABLE READ", "postgresql_readonly": True}
+    )
+    key = await render_key(db, composition_id, preset)
+    if key is None:
+        return None
+    text = render_cache.get(composition_id, preset, key)
+    if text is not None:
+        return key, text, True
+
+    result = await db.execute(
+        select(
+            CompositionItemModel.section,
+            CompositionItemModel.position,
+            CompositionItemModel.content,
+            CompositionItemModel.source_prompt_id,
+            PromptBlockModel.content.label("prompt_content"),
+        )
+        .outerjoin(PromptBlockModel, PromptBlockModel.id == CompositionItemModel.source_prompt_id)
+        .where(CompositionItemModel.composition_id == composition_id)
+    )
+    rows = result.all()
+    items = [
+        # Prompt items follow the live prompt; the stored copy covers deleted prompts.
+        RenderedItem(section, position, prompt_content if prompt_content is not None else content)
+        for section, position, content, _, prompt_content in rows
+    ]
+    text = compile_items(items, preset)
+    prompt_ids = {source_id for _, _, _, source_id, _ in rows if source_id}
+    render_cache.put(composition_id, preset, key, text, prompt_ids)
+    return key, text, False
@@ -0,0 +1,171 @@
+"""
+Inverted term index backing semantic search.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Iterable
+
+import numpy as np
+from sqlalchemy import delete, event, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ..models import PromptBlockModel, PromptInsightModel, PromptSearchTermModel
+from .embeddings import embed_profile, vector_index
+from .openrouter import content_hash, heuristic_semantic_profile
+
+TERM_PATTERN = re.compile(r"[a-z0-9\+#\.]{2,}")
+
+# Session.info key for vector changes waiting on the transaction's outcome.
+PENDING_VECTORS = "pending_vectors"
+
+
+def normalize_term(term: str) -> str:
+    return term.strip().strip(".").lower()
+
+
+def text_terms(title: str, content: str, tags: Iterable[str]) -> set[str]:
+    haystack = "\n".join([title, content, " ".join(tag for tag in tags if isinstance(tag, str))])
+    terms = {normalize_term(term) for term in TERM_PATTERN.findall(haystack.lower())}
+    return {term for term in terms if term}
+
+
+def profile_terms(profile: dict[str, Any] | None) -> set[str]:
+    if not profile:
+        return set()
+    terms = set()
+    for key in ("keywords", "constraints", "personas"):
+        for item in profile.get(key, []):
+            if isinstance(item, str):
+                terms.update(part.strip().lower() for part in item.split() if part.strip())
+    if profile.get("intent"):
+        terms.update(part.strip().lower() for part in str(profile["intent"]).split())
+    if profile.get("output_style"):
+        terms.update(part.strip().lower() for part in str(profile["output_style"]).split())
+    return terms
+
+
+async def _stored_profile(db: AsyncSession, prompt: PromptBlockModel) -> dict[str, Any] | None:
+    result = await db.execute(
+        select(PromptInsightModel.content_hash, PromptInsightModel.semantic_profile).where(
+            PromptInsightModel.prompt_id == prompt.id
+        )
+    )
+    row = result.one_or_none()
+    if row is None or not row.semantic_profile:
+        return None
+    if row.content_hash != content_hash(prompt.content):
+        return None
+    return row.semantic_profile
+
+
+def _stage_vector(db: AsyncSession, prompt_id: str, vector: np.ndarray | None) -> None:
+    """Queue an index change for after commit; ``None`` removes the prompt."""
+    db.info.setdefault(PENDING_VECTORS, {})[prompt_id] = vector
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_staged_vectors(session: Session) -> None:
+    for prompt_id, vector in session.info.pop(PENDING_VECTORS, {}).items():
+        if vector is None:
+            vector_index.remove(prompt_id)
+        else:
+            vector_index.upsert(prompt_id, vector)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_staged_vectors(session: Session, transaction: SessionTransaction) -> None:
+    # Runs after after_commit, so anything left belongs to a rolled back transaction.
+    if transaction.parent is None:
+        session.info.pop(PENDING_VECTORS, None)
+
+
+async def remove_prompt(db: AsyncSession, prompt_id: str) -> None:
+    _stage_vector(db, prompt_id, None)
+    await db.execute(
+        delete(PromptSearchTermModel).where(PromptSearchTermModel.prompt_id == prompt_id)
+    )
+
+
+async def index_prompt(
+    db: AsyncSession, prompt: PromptBlockModel, profile: dict[str, Any] | None = None
+) -> None:
+    """Replace the postings and vector for a prompt. The caller owns the commit; the
+    vector only reaches the in-memory index once it succeeds."""
+    if profile is None:
+        profile = await _stored_profile(db, prompt)
+    if profile is None:
+        profile = heuristic_semantic_profile(prompt.title, prompt.content, list(prompt.tags or []))
+
+    postings: dict[str, dict[str, Any]] = {}
+    for term in text_terms(prompt.title, prompt.content, prompt.tags or []):
+        postings[term] = {"term": term, "prompt_id": prompt.id, "in_text": True, "in_profile": False}
+    for term in profile_terms(profile):
+        posting = postings.setdefault(
+            term, {"term": term, "prompt_id": prompt.id, "in_text": False, "in_profile": False}
+        )
+        posting["in_profile"] = True
+
+    await remove_prompt(db, prompt.id)
+    if postings:
+        await db.execute(insert(PromptSearchTermModel), list(postings.values()))
+    _stage_vector(db, prompt.id, embed_profile(profile))
+
+    # Feeds the generated search_vector column; updated_at is left untouched. Writing the
+    # row stamps change_seq, bumps the ETag and notifies every client, so a refresh that
+    # lands on the same keywords must not touch it.
+    keywords = " ".join(item for item in profile.get("keywords", []) if isinstance(item, str))
+    if keywords == prompt.semantic_keywords:
+        return
+    await db.execute(
+        update(PromptBlockModel)
+        .where(PromptBlockModel.id == prompt.id)
+        .values(semantic_keywords=keywords, updated_at=PromptBlockModel.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    set_committed_value(prompt, "semantic_keywords", keywords)
+
+
+async def lookup_postings(
+    db: AsyncSession, terms: Iterable[str]
+) -> dict[str, set[str]]:
+    """Return prompt id -> matched text terms for every prompt posting any of ``terms``."""
+    terms = {term for term in terms if term}
+    if not terms:
+        return {}
+
+    result = await db.execute(
+        select(
+            PromptSearchTermModel.prompt_id,
+            PromptSearchTermModel.term,
+            PromptSearchTermModel.in_text,
+        ).where(PromptSearchTermModel.term.in_(terms))
+    )
+    matches: dict[str, set[str]] = {}
+    for prompt_id, term, in_text in result.all():
+        hits = matches.setdefault(prompt_id, set())
+        if in_text:
+            hits.add(term)
+    return matches
+
+
+async def backfill_search_index(db: AsyncSession) -> int:
+    """Index prompts that have no postings or keywords yet, e.g. rows written before the index existed."""
+    indexed = select(PromptSearchTermModel.prompt_id).distinct()
+    result = await db.execute(
+        select(PromptBlockModel).where(
+            or_(
+                PromptBlockModel.id.not_in(indexed),
+                PromptBlockModel.semantic_keywords.is_(None),
+            )
+        )
+    )
+    prompts = result.scalars().all()
+    for prompt in prompts:
+        await index_prompt(db, prompt)
+    await db.commit()
+    return len(prompts)
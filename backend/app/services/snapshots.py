@@ -0,0 +1,194 @@
+"""
+Static snapshots of published stacks, so a web server can answer public reads itself.
+
+With PUBLIC_SNAPSHOT_DIR set, every change to a published stack rewrites
+
+    <dir>/stacks/<slug>.json, .json.gz (and .json.br when brotli is installed)
+    <dir>/s/<slug>/index.html   (only with PUBLIC_SNAPSHOT_HTML_TEMPLATE set)
+
+and unpublishing or deleting the stack removes them. The HTML shell is the built
+frontend index.html with Open Graph tags for the stack injected into its head. An
+nginx location in front of the API can then serve snapshots and fall back to it:
+
+    location ~ ^/api/public/stacks/(?<slug>[a-z0-9-]+)$ {
+        root /srv/snapshots;
+        default_type application/json;
+        gzip_static on;
+        try_files /stacks/$slug.json @api;
+    }
+
+Rebuild everything (e.g. after restoring a database) with
+``python -m app.services.snapshots``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import html
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import AsyncSessionLocal
+from ..models import PublicStackResponse, StackModel
+from .public_cache import PublicPage, build_page, load_public_stack, public_cache
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_SNAPSHOT_DIR = os.getenv("PUBLIC_SNAPSHOT_DIR", "")
+PUBLIC_SNAPSHOT_HTML_TEMPLATE = os.getenv("PUBLIC_SNAPSHOT_HTML_TEMPLATE", "")
+
+SUFFIXES = {None: ".json", "gzip": ".json.gz", "br": ".json.br"}
+
+
+def _is_safe_slug(slug: str | None) -> bool:
+    return bool(slug) and Path(slug).name == slug and not slug.startswith(".")
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Replace ``path`` in one step; every writer gets its own temporary file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(descriptor, "wb") as handle:
+            handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        Path(temporary).unlink(missing_ok=True)
+        raise
+
+
+def _html_shell(template: str, payload: PublicStackResponse) -> str:
+    stack = payload.stack
+    title = html.escape(stack.name)
+    description = html.escape(stack.description or f"{len(payload.prompts)} prompts")
+    tags = [
+        f'<meta property="og:title" content="{title}" />',
+        f'<meta property="og:description" content="{description}" />',
+        '<meta property="og:type" content="website" />',
+        f'<meta name="description" content="{description}" />',
+        '<meta name="twitter:card" content="summary" />',
+    ]
+    if stack.cover_image:
+        tags.append(f'<meta property="og:image" content="{html.escape(stack.cover_image)}" />')
+    head = "\n    ".join(tags)
+    if "<title>" in template:
+        start, end = template.index("<title>"), template.index("</title>") + len("</title>")
+        template = f"{template[:start]}<title>{title}</title>{template[end:]}"
+    return template.replace("</head>", f"  {head}\n  </head>", 1)
+
+
+def _write_files(root: Path, slug: str, page: PublicPage, shell: str | None) -> None:
+    _write_atomic(root / "stacks" / f"{slug}{SUFFIXES[None]}", page.body)
+    for encoding, body in page.encoded.items():
+        _write_atomic(root / "stacks" / f"{slug}{SUFFIXES[encoding]}", body)
+    if shell is not None:
+        _write_atomic(root / "s" / slug / "index.html", shell.encode("utf-8"))
+
+
+def remove_snapshot(slug: str) -> None:
+    if not PUBLIC_SNAPSHOT_DIR or not _is_safe_slug(slug):
+        return
+    root = Path(PUBLIC_SNAPSHOT_DIR)
+    for suffix in SUFFIXES.values():
+        (root / "stacks" / f"{slug}{suffix}").unlink(missing_ok=True)
+    shell = root / "s" / slug / "index.html"
+    shell.unlink(missing_ok=True)
+    if shell.parent.exists() and not any(shell.parent.iterdir()):
+        shell.parent.rmdir()
+
+
+async def write_snapshot(db: AsyncSession, slug: str) -> bool:
+    """Write the snapshot for a published stack; False if the slug is not published."""
+    if not PUBLIC_SNAPSHOT_DIR or not _is_safe_slug(slug):
+        return False
+    generation = public_cache.generation
+    payload = await load_public_stack(db, slug)
+    if payload is None:
+        return False
+
+    page = await build_page(payload.stack.id, payload.model_dump_json().encode("utf-8"))
+    public_cache.put(slug, page, generation)
+    shell = None
+    if PUBLIC_SNAPSHOT_HTML_TEMPLATE:
+        template = await asyncio.to_thread(Path(PUBLIC_SNAPSHOT_HTML_TEMPLATE).read_text, "utf-8")
+        shell = _html_shell(template, payload)
+    await asyncio.to_thread(_write_files, Path(PUBLIC_SNAPSHOT_DIR), slug, page, shell)
+    return True
+
+
+async def refresh_public_stack(
+    db: AsyncSession, stack_id: str | None, previous_slug: str | None = None
+) -> None:
+    """Drop the cached page and bring the stack's snapshot up to date; call after commit.
+
+    Pass ``previous_slug`` when the slug or published state may have changed, so the
+    files under the old name are removed."""
+    if stack_id is None:
+        return
+    public_cache.invalidate_stack(stack_id)
+    if not PUBLIC_SNAPSHOT_DIR:
+        return
+
+    result = await db.execute(
+        select(StackModel.slug).where(StackModel.id == stack_id, StackModel.is_published)
+    )
+    slug = result.scalar_one_or_none()
+    # The write that triggered this has committed; a failed snapshot must not turn it
+    # into an error. rebuild_all repairs the files.
+    try:
+        if previous_slug and previous_slug != slug:
+            await asyncio.to_thread(remove_snapshot, previous_slug)
+        if slug:
+            await write_snapshot(db, slug)
+    except OSError:
+        logger.exception("Failed to refresh snapshot for stack %s", stack_id)
+        if slug:
+            # Better a miss that falls through to the API than a stale file.
+            try:
+                await asyncio.to_thread(remove_snapshot, slug)
+            except OSError:
+                logger.exception("Failed to remove stale snapshot %s", slug)
+
+
+async def rebuild_all(db: AsyncSession) -> tuple[int, int]:
+    """Rewrite every published stack and delete snapshots of anything else."""
+    result = await db.execute(select(StackModel.slug).where(StackModel.is_published))
+    published = {slug for slug in result.scalars().all() if slug}
+
+    written = 0
+    for slug in sorted(published):
+        written += await write_snapshot(db, slug)
+
+    stacks_dir = Path(PUBLIC_SNAPSHOT_DIR) / "stacks"
+    existing = set()
+    if stacks_dir.exists():
+        existing = {
+            path.name.split(".", 1)[0]
+            for path in stacks_dir.iterdir()
+            if not path.name.startswith(".")
+        }
+    removed = existing - published
+    for slug in removed:
+        await asyncio.to_thread(remove_snapshot, slug)
+    return written, len(removed)
+
+
+async def _run_standalone() -> None:
+    if not PUBLIC_SNAPSHOT_DIR:
+        raise SystemExit("PUBLIC_SNAPSHOT_DIR is not set")
+    async with AsyncSessionLocal() as db:
+        written, removed = await rebuild_all(db)
+    logger.info("Wrote %d stack snapshots, removed %d stale ones", written, removed)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run_standalone())
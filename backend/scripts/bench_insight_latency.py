@@ -0,0 +1,97 @@
+"""
+Measure how slow insight calls affect unrelated endpoints.
+
+Run the API against scripts/openrouter_stub.py (see its docstring), with the
+rate limit raised so the probe traffic is not throttled, e.g.
+RATE_LIMIT_DEFAULT=100000/minute. Then:
+
+    uv run python scripts/bench_insight_latency.py --api http://127.0.0.1:8000
+
+The script probes GET /api/stacks at a fixed rate while idle, then again while
+``--insights`` quality analyses are in flight on freshly created prompts, and
+prints p50/p99 for both phases.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def probe(client: httpx.AsyncClient, path: str, count: int, interval: float) -> list[float]:
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def create_prompts(client: httpx.AsyncClient, count: int) -> list[str]:
+    ids = []
+    for index in range(count):
+        prompt_id = f"bench-{uuid.uuid4()}"
+        response = await client.post(
+            "/api/blocks",
+            json={
+                "id": prompt_id,
+                "type": "instruction",
+                "title": f"Benchmark prompt {index}",
+                "content": f"Benchmark content {uuid.uuid4()}",
+                "tags": ["Bench"],
+            },
+        )
+        response.raise_for_status()
+        ids.append(prompt_id)
+    return ids
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--api", default="http://127.0.0.1:8000")
+    parser.add_argument("--probe-path", default="/api/stacks")
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.02)
+    parser.add_argument("--insights", type=int, default=32)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.api, timeout=120) as client:
+        idle = await probe(client, args.probe_path, args.probes, args.interval)
+
+        prompt_ids = await create_prompts(client, args.insights)
+        insight_calls = [
+            client.post(f"/api/insights/prompts/{prompt_id}/quality") for prompt_id in prompt_ids
+        ]
+        insight_task = asyncio.gather(*insight_calls)
+        await asyncio.sleep(0.2)
+        loaded = await probe(client, args.probe_path, args.probes, args.interval)
+        started = time.perf_counter()
+        await insight_task
+        drained = time.perf_counter() - started
+
+        for prompt_id in prompt_ids:
+            await client.delete(f"/api/blocks/{prompt_id}")
+
+    for label, samples in (("idle", idle), ("insights in flight", loaded)):
+        print(
+            f"{label:>20}: p50={statistics.median(samples):7.1f}ms "
+            f"p99={percentile(samples, 99):7.1f}ms max={max(samples):7.1f}ms"
+        )
+    print(f"{'insight drain':>20}: {drained:.1f}s after probes finished")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+Local stand-in for the OpenRouter chat completions API.
+
+Every response is delayed by STUB_LATENCY seconds (or the ``latency`` query
+parameter) so slow-model behaviour can be reproduced without network access.
+
+    STUB_LATENCY=5 uv run uvicorn scripts.openrouter_stub:app --port 8900
+    OPENROUTER_BASE_URL=http://127.0.0.1:8900/api/v1 OPENROUTER_API_KEY=stub \\
+        uv run uvicorn app.main:app --port 8000
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+
+from fastapi import FastAPI, Request
+
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", "2"))
+
+app = FastAPI(title="OpenRouter stub")
+app.state.calls = 0
+
+
+def _reply_for(system_prompt: str) -> dict:
+    if "suggested_tags" in system_prompt:
+        return {"suggested_tags": ["Stub"], "merge_suggestions": []}
+    if "score prompts" in system_prompt:
+        return {
+            "clarity": 7,
+            "specificity": 6,
+            "constraints": 5,
+            "output_definition": 6,
+            "reuse_potential": 7,
+            "ambiguity_risk": 4,
+            "summary": "Stubbed scorecard.",
+            "recommendations": [],
+        }
+    return {
+        "intent": "Stubbed profile",
+        "output_style": "structured",
+        "keywords": ["stub"],
+        "constraints": [],
+        "personas": [],
+    }
+
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request, latency: float | None = None):
+    payload = await request.json()
+    app.state.calls += 1
+    await asyncio.sleep(STUB_LATENCY if latency is None else latency)
+
+    system_prompt = next(
+        (message["content"] for message in payload.get("messages", []) if message["role"] == "system"),
+        "",
+    )
+    return {
+        "id": f"stub-{app.state.calls}",
+        "model": payload.get("model"),
+        "choices": [
+            {"message": {"role": "assistant", "content": json.dumps(_reply_for(system_prompt))}}
+        ],
+    }
+
+
+@app.get("/stats")
+async def stats():
+    return {"calls": app.state.calls, "latency": STUB_LATENCY}
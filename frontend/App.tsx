@@ -301,15 +301,95 @@ const App: React.FC = () => {
   // Initialize database and load all data
   // Load all data from API
   useEffect(() => {
-    const loadData = async () => {
+    let unsubscribe: (() => void) | undefined;
+    let cancelled = false;
+    let watermark = 0;
+    // Highest change seq announced by the stream; the client is current once its
+    // watermark reaches it.
+    let maxSeenSeq = 0;
+    let pulling = false;
+    let syncTimer: ReturnType<typeof setTimeout> | undefined;
+
+    const schedulePull = (delay: number) => {
+      clearTimeout(syncTimer);
+      syncTimer = setTimeout(pullChanges, delay);
+    };
+
+    // Change events only say what moved; the rows themselves come from one delta sync.
+    // /sync stops below the oldest open transaction, so a pull can come back short of an
+    // announced change; keep pulling until the watermark covers every event seen.
+    const pullChanges = async () => {
+      if (pulling || cancelled) return;
+      pulling = true;
       try {
-        const [loadedBlocks, loadedTagColors, loadedStacks] = await Promise.all(
-          [api.getAllBlocks(), api.getAllTagColors(), api.getAllStacks()],
+        const delta = await api.syncChanges(watermark);
+        if (cancelled) return;
+        if (delta.resyncRequired) {
+          await reload();
+          if (watermark < maxSeenSeq) schedulePull(500);
+          return;
+        }
+        const removed = (entity: string) =>
+          new Set(
+            delta.tombstones.filter((item) => item.entity === entity).map((item) => item.id),
+          );
+        const merge = <T,>(
+          items: T[],
+          changed: T[],
+          gone: Set<string>,
+          key: (item: T) => string,
+        ) => {
+          if (!changed.length && !gone.size) return items;
+          const updates = new Map(changed.map((item) => [key(item), item]));
+          const kept = items
+            .filter((item) => !gone.has(key(item)))
+            .map((item) => updates.get(key(item)) ?? item);
+          const known = new Set(kept.map(key));
+          return [...changed.filter((item) => !known.has(key(item))), ...kept];
+        };
+        setBlocks((prev) => merge(prev, delta.blocks, removed('blocks'), (item) => item.id));
+        setStacks((prev) => merge(prev, delta.stacks, removed('stacks'), (item) => item.id));
+        setTagColors((prev) =>
+          merge(prev, delta.tagColors, removed('tag_colors'), (item) => item.name),
         );
+        // Only advance once the rows up to it have been applied.
+        watermark = Math.max(watermark, delta.watermark);
+        if (watermark < maxSeenSeq) schedulePull(500);
+      } catch (error) {
+        console.error('Sync error:', error);
+        schedulePull(3000);
+      } finally {
+        pulling = false;
+      }
+    };
 
-        setBlocks(loadedBlocks);
-        setTagColors(loadedTagColors);
-        setStacks(loadedStacks);
+    // Replace local state wholesale when the server no longer has the deletes needed
+    // to bring it forward.
+    const reload = async () => {
+      const workspace = await api.getBootstrap();
+      if (cancelled) return;
+      setBlocks(workspace.blocks);
+      setTagColors(workspace.tagColors);
+      setStacks(workspace.stacks);
+      watermark = workspace.watermark;
+    };
+
+    const loadData = async () => {
+      try {
+        await reload();
+        if (!cancelled) {
+          unsubscribe = api.subscribeToChanges(
+            watermark,
+            (event) => {
+              if (event.entity === 'compositions' || event.seq <= watermark) return;
+              maxSeenSeq = Math.max(maxSeenSeq, event.seq);
+              schedulePull(250);
+            },
+            () => {
+              reload().catch((error) => console.error('Resync error:', error));
+            },
+          );
+        }
         addToast('Connected to API', 'success');
       } catch (error) {
         console.error('API error:', error);
@@ -319,6 +399,11 @@ const App: React.FC = () => {
       }
     };
     loadData();
+    return () => {
+      cancelled = true;
+      clearTimeout(syncTimer);
+      unsubscribe?.();
+    };
   }, [addToast]);
 
   // Save column count to localStorage
@@ -536,10 +621,8 @@ const App: React.FC = () => {
       );
 
       try {
-        await Promise.all(
-          blockIds.map((id) =>
-            api.updateBlock(id, { stackId: stackId || null }),
-          ),
+        await api.updateBlocks(
+          blockIds.map((id) => ({ id, updates: { stackId: stackId || null } })),
         );
         const stackName = stackId
           ? stacks.find((s) => s.id === stackId)?.name
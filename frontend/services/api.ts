@@ -2,8 +2,12 @@
  * API service for frontend/backend communication.
  */
 import {
+  BlockPage,
+  ChangeEvent,
   Composition,
   CompositionItem,
+  CompositionPage,
+  CompositionSummary,
   LineageData,
   PromptBlockData,
   PublicStackPayload,
@@ -11,8 +15,13 @@ import {
   RelatedPromptsResult,
   SemanticSearchResponse,
   Stack,
+  SyncResult,
   TagColor,
+  TagFacet,
+  TagMatch,
+  TagVocabularyEntry,
   TagSuggestionResult,
+  WorkspaceBootstrap,
 } from '../types';
 import { DEFAULT_TAG_LIGHTNESS } from '../constants';
 
@@ -24,7 +33,7 @@ const mapBlock = (block: any): PromptBlockData => ({
   id: block.id,
   type: block.type,
   title: block.title,
-  content: block.content,
+  content: block.content ?? '',
   tags: block.tags || [],
   stackId: block.stack_id ?? undefined,
   stackOrder: block.stack_order ?? undefined,
@@ -49,6 +58,12 @@ const mapStack = (stack: any): Stack => ({
   createdAt: stack.created_at ? new Date(stack.created_at) : new Date(),
 });
 
+const mapTagColor = (tc: any): TagColor => ({
+  name: tc.name,
+  hue: tc.hue,
+  lightness: tc.lightness ?? DEFAULT_TAG_LIGHTNESS,
+});
+
 const mapCompositionItem = (item: any): CompositionItem => ({
   id: item.id,
   compositionId: item.composition_id,
@@ -71,6 +86,11 @@ const mapComposition = (composition: any): Composition => ({
   items: (composition.items || []).map(mapCompositionItem),
 });
 
+const mapCompositionSummary = (summary: any): CompositionSummary => {
+  const { items, ...composition } = mapComposition(summary);
+  return { ...composition, itemCount: summary.item_count };
+};
+
 async function expectOk(response: Response, message: string) {
   if (!response.ok) {
     const detail = await response.text();
@@ -88,6 +108,47 @@ export async function getAllBlocks(): Promise<PromptBlockData[]> {
   return data.map(mapBlock);
 }
 
+/**
+ * Fetch one keyset page of blocks, newest first. Pass `fields` to skip heavy columns
+ * such as `content`; omitted fields come back with the mapper defaults.
+ */
+export async function getBlocksPage(
+  options: {
+    cursor?: string | null;
+    limit?: number;
+    fields?: string[];
+    tags?: string[];
+    tagMatch?: TagMatch;
+  } = {},
+): Promise<BlockPage> {
+  const params = new URLSearchParams();
+  if (options.cursor) params.set('cursor', options.cursor);
+  if (options.limit) params.set('limit', String(options.limit));
+  if (options.fields?.length) params.set('fields', options.fields.join(','));
+  if (options.tags?.length) params.set('tags', options.tags.join(','));
+  if (options.tagMatch) params.set('tag_match', options.tagMatch);
+
+  const response = await expectOk(
+    await fetch(`${API_URL}/api/blocks/page?${params}`),
+    'Failed to fetch blocks',
+  );
+  const data = await response.json();
+  return { items: data.items.map(mapBlock), nextCursor: data.next_cursor ?? null };
+}
+
+export async function getBlocksByIds(ids: string[], fields?: string[]): Promise<PromptBlockData[]> {
+  if (ids.length === 0) return [];
+  const params = new URLSearchParams({ ids: ids.join(',') });
+  if (fields?.length) params.set('fields', fields.join(','));
+
+  const response = await expectOk(
+    await fetch(`${API_URL}/api/blocks/batch?${params}`),
+    'Failed to fetch blocks',
+  );
+  const data = await response.json();
+  return data.map(mapBlock);
+}
+
 export async function createBlock(block: PromptBlockData): Promise<PromptBlockData> {
   const response = await expectOk(
     await fetch(`${API_URL}/api/blocks`, {
@@ -112,10 +173,7 @@ export async function createBlock(block: PromptBlockData): Promise<PromptBlockDa
   return mapBlock(await response.json());
 }
 
-export async function updateBlock(
-  id: string,
-  updates: Partial<PromptBlockData>,
-): Promise<void> {
+const toBlockChanges = (updates: Partial<PromptBlockData>) => {
   const body: any = {};
   if (updates.type !== undefined) body.type = updates.type;
   if (updates.title !== undefined) body.title = updates.title;
@@ -129,17 +187,44 @@ export async function updateBlock(
   if (updates.derivedFromStackId !== undefined) {
     body.derived_from_stack_id = updates.derivedFromStackId;
   }
+  return body;
+};
 
+export async function updateBlock(
+  id: string,
+  updates: Partial<PromptBlockData>,
+): Promise<void> {
   await expectOk(
     await fetch(`${API_URL}/api/blocks/${id}`, {
       method: 'PATCH',
       headers: jsonHeaders,
-      body: JSON.stringify(body),
+      body: JSON.stringify(toBlockChanges(updates)),
     }),
     'Failed to update block',
   );
 }
 
+/** Apply many block updates in one request and one transaction; all or nothing. */
+export async function updateBlocks(
+  updates: { id: string; updates: Partial<PromptBlockData> }[],
+): Promise<void> {
+  if (updates.length === 0) return;
+  await expectOk(
+    await fetch(`${API_URL}/api/blocks/bulk`, {
+      method: 'POST',
+      headers: jsonHeaders,
+      body: JSON.stringify({
+        operations: updates.map((item) => ({
+          op: 'update',
+          id: item.id,
+          changes: toBlockChanges(item.updates),
+        })),
+      }),
+    }),
+    'Failed to update blocks',
+  );
+}
+
 export async function deleteBlock(id: string): Promise<void> {
   await expectOk(
     await fetch(`${API_URL}/api/blocks/${id}`, { method: 'DELETE' }),
@@ -179,16 +264,103 @@ export async function forkPrompt(
   return mapBlock(await response.json());
 }
 
+/**
+ * Fetch rows changed or deleted since `since` (0 for everything). Store the returned
+ * watermark and pass it to the next call.
+ */
+export async function syncChanges(since = 0): Promise<SyncResult> {
+  const response = await expectOk(
+    await fetch(`${API_URL}/api/sync?since=${since}`),
+    'Failed to sync changes',
+  );
+  const data = await response.json();
+  return {
+    watermark: data.watermark,
+    blocks: data.blocks.map(mapBlock),
+    stacks: data.stacks.map(mapStack),
+    tagColors: data.tag_colors.map(mapTagColor),
+    tombstones: data.tombstones.map((item: any) => ({ entity: item.entity, id: item.id })),
+    resyncRequired: Boolean(data.resync_required),
+  };
+}
+
+/**
+ * Listen for changes made anywhere, starting after `since` (a sync watermark). The
+ * browser reconnects on its own and the server replays what was missed. `onResync`
+ * fires when the stream resumes from further back than deletes are kept. Returns a
+ * function that closes the stream.
+ */
+export function subscribeToChanges(
+  since: number,
+  onChange: (event: ChangeEvent) => void,
+  onResync?: () => void,
+): () => void {
+  const source = new EventSource(`${API_URL}/api/sync/stream?since=${since}`);
+  source.addEventListener('change', (message) => {
+    onChange(JSON.parse((message as MessageEvent).data));
+  });
+  source.addEventListener('resync', () => onResync?.());
+  return () => source.close();
+}
+
+/**
+ * Load blocks, stacks and tag colors in one request. The watermark can
+ * seed `syncChanges` for incremental updates afterwards.
+ */
+export async function getBootstrap(fields?: string[]): Promise<WorkspaceBootstrap> {
+  const query = fields?.length ? `?fields=${encodeURIComponent(fields.join(','))}` : '';
+  const response = await expectOk(
+    await fetch(`${API_URL}/api/bootstrap${query}`),
+    'Failed to load workspace',
+  );
+  const data = await response.json();
+  return {
+    watermark: data.watermark,
+    blocks: data.blocks.map(mapBlock),
+    stacks: data.stacks.map(mapStack),
+    tagColors: data.tag_colors.map(mapTagColor),
+  };
+}
+
 export async function getAllTagColors(): Promise<TagColor[]> {
   const response = await expectOk(
     await fetch(`${API_URL}/api/tag-colors`),
     'Failed to fetch tag colors',
   );
   const data = await response.json();
-  return data.map((tc: any) => ({
-    name: tc.name,
-    hue: tc.hue,
-    lightness: tc.lightness ?? DEFAULT_TAG_LIGHTNESS,
+  return data.map(mapTagColor);
+}
+
+/**
+ * Count blocks per tag, most used first, optionally within one stack.
+ */
+export async function getTagFacets(stackId?: string | null): Promise<TagFacet[]> {
+  const params = new URLSearchParams();
+  if (stackId) params.set('stack_id', stackId);
+  const response = await expectOk(
+    await fetch(`${API_URL}/api/tags?${params}`),
+    'Failed to fetch tag facets',
+  );
+  return response.json();
+}
+
+/**
+ * Tags in use with their usage counts and custom colors. `spelling` narrows the list to
+ * case-insensitive matches, e.g. to find "UX" and "ux" together.
+ */
+export async function getTagVocabulary(spelling?: string): Promise<TagVocabularyEntry[]> {
+  const params = new URLSearchParams();
+  if (spelling) params.set('q', spelling);
+  const response = await expectOk(
+    await fetch(`${API_URL}/api/tags/vocabulary?${params}`),
+    'Failed to fetch tag vocabulary',
+  );
+  const data = await response.json();
+  return data.map((entry: any) => ({
+    name: entry.name,
+    usageCount: entry.usage_count,
+    hue: entry.hue ?? null,
+    lightness: entry.lightness ?? null,
   }));
 }
 
@@ -321,6 +493,40 @@ export async function getCompositions(): Promise<Composition[]> {
   return data.map(mapComposition);
 }
 
+const pageParams = (options: { cursor?: string | null; limit?: number }) => {
+  const params = new URLSearchParams();
+  if (options.cursor) params.set('cursor', options.cursor);
+  if (options.limit) params.set('limit', String(options.limit));
+  return params;
+};
+
+/** Fetch one keyset page of full compositions, most recently updated first. */
+export async function getCompositionsPage(
+  options: { cursor?: string | null; limit?: number } = {},
+): Promise<CompositionPage<Composition>> {
+  const response = await expectOk(
+    await fetch(`${API_URL}/api/compositions/page?${pageParams(options)}`),
+    'Failed to fetch compositions',
+  );
+  const data = await response.json();
+  return { items: data.items.map(mapComposition), nextCursor: data.next_cursor ?? null };
+}
+
+/** Fetch composition names and item counts without item bodies. */
+export async function getCompositionSummaries(
+  options: { cursor?: string | null; limit?: number } = {},
+): Promise<CompositionPage<CompositionSummary>> {
+  const response = await expectOk(
+    await fetch(`${API_URL}/api/compositions/summaries?${pageParams(options)}`),
+    'Failed to fetch compositions',
+  );
+  const data = await response.json();
+  return {
+    items: data.items.map(mapCompositionSummary),
+    nextCursor: data.next_cursor ?? null,
+  };
+}
+
 export async function getComposition(id: string): Promise<Composition> {
   const response = await expectOk(
     await fetch(`${API_URL}/api/compositions/${id}`),
@@ -397,6 +603,22 @@ export async function updateComposition(
   return mapComposition(await response.json());
 }
 
+/**
+ * Render a saved composition on the server, section by section, with prompt items
+ * resolved to their current text.
+ */
+export async function renderComposition(
+  id: string,
+  preset: 'chatgpt' | 'claude' | 'gemini' | 'openrouter' = 'chatgpt',
+): Promise<string> {
+  const response = await expectOk(
+    await fetch(`${API_URL}/api/compositions/${id}/render?preset=${preset}`),
+    'Failed to render composition',
+  );
+  const data = await response.json();
+  return data.text;
+}
+
 export async function suggestTags(promptId: string): Promise<TagSuggestionResult> {
   const response = await expectOk(
     await fetch(`${API_URL}/api/insights/prompts/${promptId}/tags`, {
@@ -464,6 +686,7 @@ export async function findRelatedPrompts(
 export async function semanticSearch(payload: {
   query: string;
   activeTags?: string[];
+  tagMatch?: TagMatch;
   stackId?: string | null;
   limit?: number;
 }): Promise<SemanticSearchResponse> {
@@ -474,6 +697,7 @@ export async function semanticSearch(payload: {
       body: JSON.stringify({
         query: payload.query,
         active_tags: payload.activeTags || [],
+        tag_match: payload.tagMatch || 'any',
         stack_id: payload.stackId || null,
         limit: payload.limit || 20,
       }),
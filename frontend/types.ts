@@ -30,12 +30,55 @@ export interface PromptBlockData {
   isDeleting?: boolean;
 }
 
+export interface BlockPage {
+  items: PromptBlockData[];
+  nextCursor: string | null;
+}
+
+export interface SyncResult {
+  watermark: number;
+  blocks: PromptBlockData[];
+  stacks: Stack[];
+  tagColors: TagColor[];
+  tombstones: { entity: 'blocks' | 'stacks' | 'tag_colors'; id: string }[];
+  /** `since` predates the tombstone retention window; reload instead of merging. */
+  resyncRequired: boolean;
+}
+
+export interface ChangeEvent {
+  entity: 'blocks' | 'stacks' | 'tag_colors' | 'compositions';
+  op: 'upsert' | 'delete';
+  id: string;
+  seq: number;
+}
+
+export interface WorkspaceBootstrap {
+  watermark: number;
+  blocks: PromptBlockData[];
+  stacks: Stack[];
+  tagColors: TagColor[];
+}
+
 export interface TagColor {
   name: string;
   hue: number;
   lightness: number;
 }
 
+export interface TagFacet {
+  name: string;
+  count: number;
+}
+
+export type TagMatch = 'any' | 'all';
+
+export interface TagVocabularyEntry {
+  name: string;
+  usageCount: number;
+  hue: number | null;
+  lightness: number | null;
+}
+
 export interface Stack {
   id: string;
   name: string;
@@ -166,6 +209,15 @@ export interface Composition {
   items: CompositionItem[];
 }
 
+export interface CompositionSummary extends Omit<Composition, 'items'> {
+  itemCount: number;
+}
+
+export interface CompositionPage<T> {
+  items: T[];
+  nextCursor: string | null;
+}
+
 export interface SemanticSearchResult {
   promptId: string;
   score: number;